@@ -2,7 +2,13 @@
 # pylint: disable=too-many-function-args
 
 from __future__ import print_function
+import collections
+import hashlib
+import marshal
+import os
 import re
+import sys
+import time
 #  This Python package implements the conversion between Unicode Tibetan text, and
 #  Wylie (EWTS) transliteration.
 #  It is based on the equivalent Java module, found at
@@ -12,6 +18,167 @@ import re
 #  The Extended Wylie Transliteration System is documented at:
 #  http://www.thlib.org/reference/transliteration/#essay=/thl/ewts/
 
+#  version of the converter; bump it whenever the conversion output can change, since it
+#  is part of the key of persisted conversion results (see WylieCache.py)
+__version__ = "1.2.1"
+
+#  a run of plain text inside a [comment], copied as one token
+COMMENT_RUN = re.compile(u"[^\\[\\]\\\\]+")
+
+
+#  Raised by fromWylie() and toWylieOptions() when a conversion runs over its time budget.
+#  'position' is the index of the token (fromWylie) or character (toWylieOptions) reached.
+class BudgetExceeded(Exception):
+
+    def __init__(self, budget, position):
+        Exception.__init__(self, "Conversion budget of %g s exceeded at position %d." % (budget, position))
+        self.budget = budget
+        self.position = position
+
+
+#  Warning aggregation for corpus-scale diagnostics: pass one instead of a warnings list to
+#  fromWylie() / toWylieOptions().  Instead of one string per warning, it counts occurrences
+#  per (warning, syllable) and keeps the first 'max_locations' locations of each, so that its
+#  memory is bounded by the number of distinct problems.  Set 'source' to the name of the
+#  document being converted to have it in the locations.
+class WarningAggregator(object):
+
+    def __init__(self, max_locations=5):
+        self.max_locations = max_locations
+        self.source = None
+        self.total = 0
+        # (warning, syllable) => [count, [locations]]
+        self.problems = {}
+
+    def add(self, message, syllable=None, line=None):
+        self.total += 1
+        key = (message, syllable)
+        entry = self.problems.get(key)
+        if entry is None:
+            entry = self.problems[key] = [0, []]
+        entry[0] += 1
+        if len(entry[1]) < self.max_locations:
+            entry[1].append(line if self.source is None else "%s:%s" % (self.source, line))
+
+    #  so that it can stand in for a warnings list
+    def append(self, str_):
+        self.add(str_)
+
+    def __len__(self):
+        return self.total
+
+    def merge(self, other):
+        self.total += other.total
+        for key, (count, locations) in other.problems.items():
+            entry = self.problems.get(key)
+            if entry is None:
+                entry = self.problems[key] = [0, []]
+            entry[0] += count
+            entry[1].extend(locations[:self.max_locations - len(entry[1])])
+        return self
+
+    #  the problems, most frequent first, and the counts per kind of warning (with the quoted
+    #  parts of the messages blanked out)
+    def summary(self):
+        problems = sorted(self.problems.items(), key=lambda kv: (-kv[1][0], kv[0][0], kv[0][1] or ""))
+        kinds = {}
+        for (message, _), (count, _) in problems:
+            kind = re.sub('"[^"]*"', '"..."', message)
+            kinds[kind] = kinds.get(kind, 0) + count
+        return {
+            "total": self.total,
+            "distinct": len(self.problems),
+            "kinds": kinds,
+            "problems": [{"warning": message, "syllable": syllable, "count": count, "locations": locations}
+                         for (message, syllable), (count, locations) in problems],
+        }
+
+
+#  Statistics of the text a conversion goes through, collected when passed as 'stats' to
+#  fromWylie() or toWylieOptions() (or to fromWylieOneTsekbar() / toWylieOneTsekbar()).
+#
+#  Only the syllables (tsekbars) are counted while converting, keyed by their Unicode so that
+#  both directions count alike: one counter update per tsekbar.  counts() then derives, once
+#  per distinct syllable, what they are made of, with the stack analysis of toWylieOneStack():
+#    - stacks  : keyed by their consonants in EWTS joined with "+" (st.cons_str, as "s+k+y";
+#                "a" for a vowel on its own)
+#    - vowels  : vowel signs ("i", "I", "-i"...; the inherent "a" is not counted)
+#    - finals  : final signs ("M", "H", "~M`"...)
+#    - sanskrit: the stacks of several consonants which are not standard Tibetan stacks, i.e.
+#                those which EWTS writes with "+"
+#  The syllable counter is all the state, so workers can send their ConversionStats back
+#  (they pickle) and merge() adds them up.
+class ConversionStats(object):
+
+    def __init__(self, wylie=None):
+        self.wylie = wylie
+        self.syllables = collections.Counter()
+        # syllable => ((cons_str, vowels, finals), ...)
+        self.analyzed = {}
+
+    def merge(self, other):
+        self.syllables.update(other.syllables)
+        return self
+
+    #  the stacks of one syllable, as ((cons_str, vowels, finals), ...)
+    def analyze(self, syllable):
+        ret = self.analyzed.get(syllable)
+        if ret is not None:
+            return ret
+        w = self.wylie if self.wylie is not None else sharedWylie()
+        stacks = []
+        length = len(syllable)
+        i = 0
+        while i < length:
+            if w.tib_top(syllable[i]) is None:
+                i += 1
+                continue
+            try:
+                st = w.toWylieOneStack(syllable, length, i)
+            except Exception:
+                # a stack which toWylie() cannot read either (e.g. "f" on its own)
+                i += 1
+                continue
+            # a vowel on its own is written on a-chen, which toWylieOneStack() drops
+            stacks.append((st.cons_str or "a", tuple(st.vowels), tuple(st.finals)))
+            i += st.tokens_used
+        ret = self.analyzed[syllable] = tuple(stacks)
+        return ret
+
+    #  the counters: {"syllables": ..., "stacks": ..., "vowels": ..., "finals": ..., "sanskrit": ...}
+    def counts(self):
+        w = self.wylie if self.wylie is not None else sharedWylie()
+        stacks = collections.Counter()
+        vowels = collections.Counter()
+        finals = collections.Counter()
+        sanskrit = collections.Counter()
+        for syllable, n in self.syllables.items():
+            for cons_str, vs, fs in self.analyze(syllable):
+                stacks[cons_str] += n
+                if "+" in cons_str and not w.tib_stack(cons_str):
+                    sanskrit[cons_str] += n
+                for v in vs:
+                    vowels[v] += n
+                for f in fs:
+                    finals[f] += n
+        return {"syllables": self.syllables, "stacks": stacks, "vowels": vowels, "finals": finals,
+                "sanskrit": sanskrit}
+
+    #  totals, number of distinct items and the 'top' most frequent ones of each counter
+    def summary(self, top=20):
+        ret = {}
+        for name, counter in self.counts().items():
+            ret[name] = {
+                "total": sum(counter.values()),
+                "distinct": len(counter),
+                "top": counter.most_common(top),
+            }
+        return ret
+
+    #  only the syllable counter is worth sending to another process
+    def __getstate__(self):
+        return {"wylie": self.wylie, "syllables": self.syllables, "analyzed": {}}
+
 
 class Wylie(object):
     #  various options for Wylie conversion
@@ -46,6 +213,54 @@ class Wylie(object):
     m_subscripts = {}
     m_prefixes = {}
     m_suff2 = {}
+    m_acip = {}
+    m_acip_wylie = {}
+
+    #  names of all the tables built by initHashes(), i.e. the compiled state of the converter
+    TABLES = ("m_consonant", "m_subjoined", "m_vowel", "m_final_uni", "m_final_class", "m_other",
+              "m_ambiguous_wylie", "m_tib_vowel_long", "m_tib_caret", "m_tib_top", "m_tib_subjoined",
+              "m_tib_vowel", "m_tib_final_wylie", "m_tib_final_class", "m_tib_other", "m_ambiguous_key",
+              "m_tokens_start", "m_special", "m_suffixes", "m_tib_stacks", "m_tokens", "m_superscripts",
+              "m_subscripts", "m_prefixes", "m_suff2", "m_acip", "m_acip_wylie")
+
+    #  longest consonant string compared against the tables, and longest tsekbar quoted in
+    #  warnings: without a bound, hostile input (thousands of stacks in one tsekbar) makes
+    #  both the checks and the warnings grow quadratically
+    MAX_CONTEXT = 64
+
+    #  with an output sink, converted text is written to it every SINK_BATCH output pieces
+    #  (tsekbars, punctuation, pass-through runs...)
+    SINK_BATCH = 4096
+
+    #  have the tables of this class been built yet in this process?
+    _tables_ready = False
+
+    #  Builds the tables once per process, on the class: every later Wylie() shares them
+    #  instead of running initHashes() again.  (Subclasses with their own tables, like the
+    #  variants of WylieOverlay, set their own _tables_ready.)
+    @classmethod
+    def loadHashes(self):
+        if self.__dict__.get("_tables_ready"):
+            return
+        self.initHashes()
+        self._tables_ready = True
+
+    #  Fingerprint of the source file defining initHashes() (which holds all the table
+    #  contents) and of the Python version: WylieCompile tags the engines it generates with it,
+    #  so that a stale one is regenerated.
+    @classmethod
+    def tablesFingerprint(self):
+        code = self.initHashes.__func__.__code__
+        h = hashlib.sha1()
+        h.update(("%s\0%s\0%s" % (sys.version, self.__name__, code.co_filename)).encode("utf-8"))
+        # stat()-ing the source, like .pyc files do, is much cheaper than hashing the code;
+        # fall back to the code itself when there is no source file (zipped installs...)
+        try:
+            st = os.stat(code.co_filename)
+            h.update(("%d\0%d" % (st.st_mtime_ns, st.st_size)).encode("utf-8"))
+        except (IOError, OSError):
+            h.update(marshal.dumps(code))
+        return h.digest()
 
     #  initialize all the hashes with the correspondences between Wylie and Unicode.
     #  this gets called from a 'static section' to initialize the hashes the moment the
@@ -908,6 +1123,156 @@ class Wylie(object):
         self.m_tokens.append("~M")
         self.m_tokens.append("~X")
         self.m_tokens.append("\r\n")
+        #  *** Wylie to ACIP mappings (see WylieAcip.py) ***
+        #  ACIP spells a tsekbar with the same structure as Wylie, so these map single tokens.
+        #  long vowels are marked with ' after the vowel; ACIP has no Unicode escapes,
+        #  reversed Sanskrit letters, fixed-form letters or candrabindu.
+        self.m_acip = {
+            "k": "K",
+            "kh": "KH",
+            "g": "G",
+            "gh": "GH",
+            "g+h": "G+H",
+            "ng": "NG",
+            "c": "C",
+            "ch": "CH",
+            "j": "J",
+            "ny": "NY",
+            "T": "TT",
+            "Th": "TTH",
+            "D": "DD",
+            "Dh": "DDH",
+            "D+h": "DD+H",
+            "N": "NN",
+            "t": "T",
+            "th": "TH",
+            "d": "D",
+            "dh": "DH",
+            "d+h": "D+H",
+            "n": "N",
+            "p": "P",
+            "ph": "PH",
+            "b": "B",
+            "bh": "BH",
+            "b+h": "B+H",
+            "m": "M",
+            "ts": "TS",
+            "tsh": "TSH",
+            "dz": "DZ",
+            "dzh": "DZH",
+            "dz+h": "DZ+H",
+            "w": "W",
+            "zh": "ZH",
+            "z": "Z",
+            "'": "'",
+            u"\u2018": "'",
+            u"\u2019": "'",
+            "y": "Y",
+            "r": "R",
+            "l": "L",
+            "sh": "SH",
+            "Sh": "SHH",
+            "s": "S",
+            "h": "H",
+            "a": "A",
+            "A": "A'",
+            "i": "I",
+            "I": "I'",
+            "u": "U",
+            "U": "U'",
+            "e": "E",
+            "ai": "EE",
+            "o": "O",
+            "au": "OO",
+            "-i": "-I",
+            "-I": "-I'",
+            "M": "m",
+            "H": ":",
+            "+": "+",
+            ".": "-",
+            " ": " ",
+            "_": " ",
+            "/": ",",
+            "//": ",,",
+            "0": "0",
+            "1": "1",
+            "2": "2",
+            "3": "3",
+            "4": "4",
+            "5": "5",
+            "6": "6",
+            "7": "7",
+            "8": "8",
+            "9": "9",
+        }
+        #  ACIP token => Wylie.  "'" after a vowel is handled by the transcoder: a long vowel
+        #  after i, u or -i at the end of a stack, the letter a-chung otherwise.
+        self.m_acip_wylie = {
+            "K": "k",
+            "KH": "kh",
+            "G": "g",
+            "GH": "gh",
+            "NG": "ng",
+            "C": "c",
+            "CH": "ch",
+            "J": "j",
+            "NY": "ny",
+            "TT": "T",
+            "TTH": "Th",
+            "DD": "D",
+            "DDH": "Dh",
+            "NN": "N",
+            "T": "t",
+            "TH": "th",
+            "D": "d",
+            "DH": "dh",
+            "N": "n",
+            "P": "p",
+            "PH": "ph",
+            "B": "b",
+            "BH": "bh",
+            "M": "m",
+            "TS": "ts",
+            "TSH": "tsh",
+            "DZ": "dz",
+            "DZH": "dzh",
+            "W": "w",
+            "ZH": "zh",
+            "Z": "z",
+            "'": "'",
+            "Y": "y",
+            "R": "r",
+            "L": "l",
+            "SH": "sh",
+            "SHH": "Sh",
+            "S": "s",
+            "H": "h",
+            "A": "a",
+            "I": "i",
+            "U": "u",
+            "E": "e",
+            "EE": "ai",
+            "O": "o",
+            "OO": "au",
+            "-I": "-i",
+            "m": "M",
+            ":": "H",
+            "+": "+",
+            "-": ".",
+            " ": " ",
+            ",": "/",
+            ",,": "//",
+            "0": "0",
+            "1": "1",
+            "2": "2",
+            "3": "3",
+            "4": "4",
+            "5": "5",
+            "6": "6",
+            "7": "7",
+            "8": "8",
+            "9": "9",
+        }
 
     #  setup a wylie object
     def initWylie(self, check, check_strict, print_warnings, fix_spacing):
@@ -919,7 +1284,7 @@ class Wylie(object):
         self.check_strict = check_strict
         self.print_warnings = print_warnings
         self.fix_spacing = fix_spacing
-        self.initHashes()
+        self.loadHashes()
 
     #  constructor passing all options
     #  see the comments at the beginning of this file for more details.
@@ -1029,14 +1394,29 @@ class Wylie(object):
     #  split a string into Wylie tokens;
     # make sure there is room for at least one null element at the end of the
     # array
-    def splitIntoTokens(self, str_):  # noqa: C901
+    def splitIntoTokens(self, str_, deadline=None, budget=None):  # noqa: C901
         i = 0
         o = 0
         maxlen = len(str_)
         tokens = [''] * (maxlen + 2)
+        # [comment] nesting: inside comments, text between brackets and escapes is one token
+        nesting = 0
         while i < maxlen:
+            if deadline is not None and o & 1023 == 0 and time.perf_counter() > deadline:
+                raise BudgetExceeded(budget, i)
             try:
                 c = str_[i]
+                if c == '[':
+                    nesting += 1
+                elif c == ']':
+                    if nesting > 0:
+                        nesting -= 1
+                elif nesting > 0 and c != '\\':
+                    m = COMMENT_RUN.match(str_, i)
+                    tokens[o] = m.group()
+                    o += 1
+                    i = m.end()
+                    raise Exception("Continue")
                 mlo = self.m_tokens_start.get(c, None)
                 # if there are multi-char tokens starting with this char, try
                 # them
@@ -1055,17 +1435,17 @@ class Wylie(object):
                 #  things starting with backslash are special
                 if c == '\\' and i <= maxlen - 2:
                     if str_[i + 1] == 'u' and i <= maxlen - 6:
-                        tokens[o] = str_.substring(i, i + 6)
+                        tokens[o] = str_[i: i + 6]
                         o += 1
                         #  \\uxxxx
                         i += 6
                     elif str_[i + 1] == 'U' and i <= maxlen - 10:
-                        tokens[o] = str_.substring(i, i + 10)
+                        tokens[o] = str_[i: i + 10]
                         o += 1
                         #  \\Uxxxxxxxx
                         i += 10
                     else:
-                        tokens[o] = str_.substring(i, i + 2)
+                        tokens[o] = str_[i: i + 2]
                         o += 1
                         #  \\x
                         i += 2
@@ -1083,8 +1463,9 @@ class Wylie(object):
         # within the array of tokens.
         #
         # Assumes that the first available token is valid, and is either a vowel or a consonant.
-        # Returns a WylieTsekbar object
-    def fromWylieOneTsekbar(self, tokens, i):  # noqa: C901
+        # Returns a WylieTsekbar object.  'stacks', if given, is a list which receives the
+        # WylieStack of every stack parsed.
+    def fromWylieOneTsekbar(self, tokens, i, deadline=None, budget=None, stats=None, stacks=None):  # noqa: C901
         orig_i = i
         t = tokens[i]
 
@@ -1119,12 +1500,16 @@ class Wylie(object):
 
         # iterate over the stacks of a tsek-bar
         while t is not None and (self.vowel(t) is not None or self.consonant(t) is not None) and not visarga:  # STACK
+            if deadline is not None and time.perf_counter() > deadline:
+                raise BudgetExceeded(budget, i)
 
             # translate a stack
             if stack is not None:
                 prev_cons = stack.single_consonant
 
             stack = self.fromWylieOneStack(tokens, i)
+            if stacks is not None:
+                stacks.append(stack)
             i += stack.tokens_used
             t = tokens[i]
             out += stack.uni_string
@@ -1227,6 +1612,9 @@ class Wylie(object):
                     warns.append("Syllable should probably be \"" +
                                  self.ambiguous_wylie(cc) + "\".")
 
+        if stats is not None:
+            stats.syllables[out] += 1
+
         # return the stuff as a WylieTsekbar struct
         ret = Wylie.WylieTsekbar()
         ret.uni_string = out
@@ -1235,64 +1623,83 @@ class Wylie(object):
         return ret
 
     def unicodeEscape(self, warns, line, t):
-        hex = t.substring(2)
-        if hex.isEmpty():
+        hex = t[2:]
+        if not hex:
             return None
-        if not self.validHex(hex):
+        # beyond the last code point, or a lone surrogate: not a character
+        code = int(hex, base=16) if self.validHex(hex) else None
+        if code is None or code > 0x10ffff or 0xd800 <= code <= 0xdfff:
             self.warnl(warns, line, "\"" + t + "\": invalid hex code.")
             return ""
-        return str(int(hex, base=16))
-        # Character.valueOf(str(int(hex, base=16))).__str__()
+        return chr(code)
 
     #  Converts a Wylie (EWTS) string to unicode.  If 'warns' is not the null List, puts warnings into it.
+    #  'line' is the line number of the start of str_, used in the warnings.
+    #  'budget', if given, is a time limit in seconds: BudgetExceeded is raised when it runs out.
+    #  'sink', if given, receives the output in bounded batches instead of it being returned:
+    #  any object with a write() method, or a callable.  The number of characters written is
+    #  returned then.
+    #  'stats', if given, is a ConversionStats which counts the syllables, stacks, etc converted.
+    #  The conversion time is linear in the length of str_.
     # @fromWylie.register(object, str, List)
-    def fromWylie(self, str_, warns=None):  # noqa: C901
+    def fromWylie(self, str_, warns=None, line=1, budget=None, sink=None, stats=None):  # noqa: C901
         out = []
-        line = 1
         units = 0
+        deadline = time.perf_counter() + budget if budget is not None else None
+        # without a sink, batches are collected as compact strings and joined at the end
+        chunks = [] if sink is None else None
+        write = chunks.append if sink is None else self.sinkWriter(sink)
+        written = 0
 
         #  remove initial spaces if required
         if self.fix_spacing:
             str_ = re.sub("^\\s+", "", str_, 1)
 
         #  split into tokens
-        tokens = self.splitIntoTokens(str_)
+        tokens = self.splitIntoTokens(str_, deadline, budget)
         i = 0
 
         #  iterate over the tokens
         # __i_5 = i
         while tokens[i] != '':  # ITER
+            if deadline is not None and time.perf_counter() > deadline:
+                raise BudgetExceeded(budget, i)
+            if len(out) >= self.SINK_BATCH:
+                written += self.flushOutput(write, out)
+            start = i
             try:
                 t = tokens[i]
                 o = None
 
                 #  [non-tibetan text] : pass through, nesting brackets
+                #  (the tokenizer gives runs of plain text as single tokens, copied as they are)
                 if t == "[":
                     nesting = 1
+                    start_line = line
                     i += 1
-                    while tokens[i] is not None:  # ESC
+                    while tokens[i] != '':  # ESC
                         t = tokens[i]
                         i += 1
                         if t == "[":
                             nesting += 1
-                        if t == "]":
+                        elif t == "]":
                             nesting -= 1
-                        if nesting == 0:
-                            raise Exception("Continue")  # ITER
+                            if nesting == 0:
+                                raise Exception("Continue")  # ITER
 
                         # handle unicode escapes and \1-char escapes within
                         # [comments]...
-                        if t.startsWith("\\u") or t.startsWith("\\U"):
-                            o = self.unicodeEscape(warns, line, t)
-                            if o is not None:
-                                out.append(o)
-                                continue  # ESC
-                        if t.startsWith("\\"):
-                            o = t.substring(1)
-                        else:
-                            o = t
-                        out.append(o)
-                    self.warnl(warns, line, "Unfinished [non-Wylie stuff].")
+                        elif t[0] == "\\":
+                            if t.startswith("\\u") or t.startswith("\\U"):
+                                o = self.unicodeEscape(warns, line, t)
+                                if o is not None:
+                                    out.append(o)
+                                    continue  # ESC
+                            t = t[1:]
+                        elif "\n" in t or "\r" in t:
+                            line += t.count("\n") + t.count("\r") - t.count("\r\n")
+                        out.append(t)
+                    self.warnl(warns, start_line, "Unfinished [non-Wylie stuff].")
                     break  # ITER
 
                 #  punctuation, numbers, etc
@@ -1303,21 +1710,24 @@ class Wylie(object):
                     units += 1
                     #  collapse multiple spaces?
                     if t == " " and self.fix_spacing:
-                        while tokens[i] is not None and tokens[i] == " ":
-                            pass
+                        while tokens[i] == " ":
+                            i += 1
                     continue
                 if self.vowel(t) is not None or self.consonant(t) is not None:
-                    tb = self.fromWylieOneTsekbar(tokens, i)
-                    word = ""
-                    j = 0
-                    while j < tb.tokens_used:
-                        word += tokens[i + j]
-                        j += 1
+                    tb = self.fromWylieOneTsekbar(tokens, i, deadline, budget, stats)
+                    if tb.warns:
+                        word = "".join(tokens[i: i + min(tb.tokens_used, self.MAX_CONTEXT)])
+                        if tb.tokens_used > self.MAX_CONTEXT:
+                            word += "..."
+                        if isinstance(warns, WarningAggregator):
+                            for w in tb.warns:
+                                self.warnAggregated(warns, line, word, w)
+                        else:
+                            for w in tb.warns:
+                                self.warnl(warns, line, "\"" + word + "\": " + w)
                     out.append(tb.uni_string)
                     i += tb.tokens_used
                     units += 1
-                    for w in tb.warns:
-                        self.warnl(warns, line, "\"" + word + "\": " + w)
                     continue
                 if t == u"\ufeff" or t == u"\u200b":
                     i += 1
@@ -1329,7 +1739,7 @@ class Wylie(object):
                         out.append(o)
                         continue
                 if t.startswith("\\"):
-                    out.append(t.substring(1))
+                    out.append(t[1:])
                     i += 1
                     continue
                 if t == "\r\n" or t == "\n" or t == "\r":
@@ -1337,8 +1747,8 @@ class Wylie(object):
                     out.append(t)
                     i += 1
                     if self.fix_spacing:
-                        while tokens[i] is not None and tokens[i] == " ":
-                            pass
+                        while tokens[i] == " ":
+                            i += 1
                     continue
                 if t == '':
                     i += 1
@@ -1348,18 +1758,24 @@ class Wylie(object):
                     self.warnl(warns, line, "Unexpected character \"" + t + "\".")
                 out.append(t)
                 i += 1
+            except BudgetExceeded:
+                raise
             except Exception:
+                # skip a token which could not be handled, so that the loop always progresses
+                if i == start:
+                    i += 1
                 continue
 
         if units == 0:
             self.warn(warns, "No Tibetan characters found!")
-        return ''.join(out)
+        written += self.flushOutput(write, out)
+        return written if chunks is None else "".join(chunks)
 
     def validHex(self, t):
         i = 0
         while i < len(t):
             c = t[i]
-            if not ((c >= 'a' and c <= 'f') or (c >= '0' and c <= '9')):
+            if not ((c >= 'a' and c <= 'f') or (c >= 'A' and c <= 'F') or (c >= '0' and c <= '9')):
                 return False
             i += 1
         return True
@@ -1371,7 +1787,17 @@ class Wylie(object):
             print(str_)
 
     def warnl(self, warns, line, str_):
-        self.warn(warns, "line " + str(line) + ": " + str_)
+        if isinstance(warns, WarningAggregator):
+            self.warnAggregated(warns, line, None, str_)
+        else:
+            self.warn(warns, "line " + str(line) + ": " + str_)
+
+    #  An aggregator gets the raw message and the syllable, so that repeated warnings share one
+    #  entry; with print_warnings, the full warning is printed as well.
+    def warnAggregated(self, agg, line, syllable, str_):
+        agg.add(str_, syllable, line)
+        if self.print_warnings:
+            print("line " + str(line) + ": " + ("" if syllable is None else "\"" + syllable + "\": ") + str_)
 
     def debug(self, str_):
         print(str_)
@@ -1589,7 +2015,7 @@ class Wylie(object):
 
     def consonantString(self, tokens, i):
         out = []
-        while tokens[i] is not None:
+        while tokens[i] is not None and len(out) < self.MAX_CONTEXT:
             t = tokens[i]
             i += 1
             if t == "+" or t == "^":
@@ -1601,7 +2027,7 @@ class Wylie(object):
 
     def consonantStringBackwards(self, tokens, i, orig_i):
         out = []
-        while i >= orig_i and tokens[i] is not None:
+        while i >= orig_i and tokens[i] is not None and len(out) < self.MAX_CONTEXT:
             t = tokens[i]
             i -= 1
             if t == "+" or t == "^":
@@ -1638,15 +2064,27 @@ class Wylie(object):
         #    str   : the unicode string to be converted
         #    escape: whether to escape non-tibetan characters according to Wylie encoding.
         #            if escape == false, anything that is not tibetan will be just passed through.
+        #    line  : line number of the start of str, used in the warnings.
+        #    budget: time limit in seconds, if any: BudgetExceeded is raised when it runs out.
+        #    sink  : if given, receives the output in bounded batches (see fromWylie())
+        #    stats : if given, a ConversionStats counting the syllables, stacks, etc converted
         #
-        # Returns: the transliterated string.
+        # Returns: the transliterated string, or the number of characters written to the sink.
+        # The conversion time is linear in the length of str.
         #
         # To get the warnings, call getWarnings() afterwards.
     # @toWylie.register(object, str, List, bool)
-    def toWylieOptions(self, str_, warns, escape):  # noqa: C901
-        out = ""
-        line = 1
+    def toWylieOptions(self, str_, warns, escape, line=1, budget=None, sink=None, stats=None):  # noqa: C901
+        out = []
         units = 0
+        deadline = time.perf_counter() + budget if budget is not None else None
+        # without a sink, batches are collected as compact strings and joined at the end
+        chunks = [] if sink is None else None
+        write = chunks.append if sink is None else self.sinkWriter(sink)
+        written = 0
+        # end of the current run of spaces, and whether non-tibetan follows it
+        spaces_end = -1
+        spaces_nontib = False
 
         # globally search and replace some deprecated pre-composed Sanskrit
         # vowels
@@ -1662,12 +2100,16 @@ class Wylie(object):
 
         # iterate over the string, codepoint by codepoint
         while i < length:  # ITER
+            if deadline is not None and time.perf_counter() > deadline:
+                raise BudgetExceeded(budget, i)
+            if len(out) >= self.SINK_BATCH:
+                written += self.flushOutput(write, out)
             t = str_[i]
 
             # found tibetan script - handle one tsekbar
             if self.tib_top(t) is not None:
-                tb = self.toWylieOneTsekbar(str_, length, i)
-                out += tb.wylie
+                tb = self.toWylieOneTsekbar(str_, length, i, deadline, budget, stats)
+                out.append(tb.wylie)
                 i += tb.tokens_used
                 units += 1
                 for w in tb.warns:
@@ -1680,8 +2122,14 @@ class Wylie(object):
                 # - in non-escaping mode: spaces are not turned to '_' here (handled by handleSpaces)
                 # - in escaping mode: don't do spaces if there is non-tibetan coming, so they become part
             o = self.tib_other(t)
-            if o is not None and (t != ' ' or (escape and not self.followedByNonTibetan(str_, i))):
-                out += o
+            if t == ' ' and escape and i >= spaces_end:
+                # once per run of spaces: looking ahead from every space is quadratic
+                spaces_end = i
+                while spaces_end < length and str_[spaces_end] == ' ':
+                    spaces_end += 1
+                spaces_nontib = self.followedByNonTibetan(str_, i)
+            if o is not None and (t != ' ' or (escape and not spaces_nontib)):
+                out.append(o)
                 i += 1
                 units += 1
                 if not escape:
@@ -1692,10 +2140,10 @@ class Wylie(object):
             if t == '\r' or t == '\n':
                 line += 1
                 i += 1
-                out += t
+                out.append(t)
                 if t == '\r' and i < length and str_[i] == '\n':
                     i += 1
-                    out += '\n'
+                    out.append('\n')
                 continue  # ITER
 
             # ignore BOM and zero-width space
@@ -1705,14 +2153,14 @@ class Wylie(object):
 
             # anything else - pass along?
             if not escape:
-                out += t
+                out.append(t)
                 i += 1
                 continue  # ITER
 
             # other characters in the tibetan plane, escape with \\u0fxx
             if t > u'\u0f00' and t <= u'\u0fff':
                 # c = t.encode("utf8")
-                out += t
+                out.append(t)
                 i += 1
 
                 # warn for tibetan codepoints that should appear only after a
@@ -1725,29 +2173,70 @@ class Wylie(object):
             # ... or escape according to Wylie:
                 # put it in [comments], escaping[] sequences and closing at
                 # line ends
-            out += "["
+            out.append("[")
             while self.tib_top(t) is None and (self.tib_other(t) is None or t == ' ') and t != '\r' and t != '\n':
                 # \escape [opening and closing] brackets
                 if t == '[' or t == ']':
-                    out += "\\"
-                    out += t
+                    out.append("\\")
+                    out.append(t)
 
                 # unicode-escape anything in the tibetan plane (i.e characters
                 # not handled by Wylie)
                 elif t > u'\u0f00' and t <= u'\u0fff':
-                    out += self.formatHex(t)
+                    out.append(self.formatHex(t))
 
                 # and just pass through anything else!
                 else:
-                    out += t
+                    out.append(t)
 
                 i += 1
                 if i >= length:
                     break
 
                 t = str_[i]
-            out += "]"
-        return out
+            out.append("]")
+        written += self.flushOutput(write, out)
+        return written if chunks is None else "".join(chunks)
+
+    #  Convenience wrappers for callers holding UTF-8 buffers (bytes, bytearray, memoryview...):
+    #  the buffer is decoded, converted with fromWylie() / toWylieOptions() and the result
+    #  encoded, exactly as the caller would do it; they are not faster than doing so.
+    #
+    #  If 'out' is None the result is returned as bytes.  Otherwise it is written into 'out'
+    #  and the number of bytes written is returned: a bytearray is appended to, any other
+    #  writable buffer is filled from its start (ValueError if it is too small).
+    def fromWylieBytes(self, data, out=None, warns=None):
+        return self.writeBuffer(out, self.fromWylie(str(data, "utf-8"), warns).encode("utf-8"))
+
+    def toWylieBytes(self, data, out=None, warns=None, escape=True):
+        return self.writeBuffer(out, self.toWylieOptions(str(data, "utf-8"), warns, escape).encode("utf-8"))
+
+    def writeBuffer(self, out, b):
+        if out is None:
+            return b
+        if isinstance(out, bytearray):
+            out += b
+            return len(b)
+        view = memoryview(out).cast("B")
+        if len(b) > len(view):
+            raise ValueError("Output buffer too small: " + str(len(b)) + " bytes needed, " +
+                             str(len(view)) + " available.")
+        view[:len(b)] = b
+        return len(b)
+
+    #  the write function of an output sink: its write() method, or the sink itself if it is a
+    #  callable
+    def sinkWriter(self, sink):
+        return getattr(sink, "write", sink)
+
+    #  write the pending output pieces to the sink and empty the list; returns the length written
+    def flushOutput(self, write, out):
+        if not out:
+            return 0
+        s = "".join(out)
+        del out[:]
+        write(s)
+        return len(s)
 
     def formatHex(self, t):
         return u''.join(char if 32 <= ord(char) <= 126 else u'\\u%04x' % ord(char) for char in t)
@@ -1762,11 +2251,13 @@ class Wylie(object):
         return self.tib_top(t) is None and self.tib_other(t) is None and t != '\r' and t != '\n'
 
     # C onvert Unicode to Wylie: one tsekbar
-    def toWylieOneTsekbar(self, str_, length, i):  # noqa: C901
+    def toWylieOneTsekbar(self, str_, length, i, deadline=None, budget=None, stats=None):  # noqa: C901
         orig_i = i
         warns = []
         stacks = []
         while True:  # ITER
+            if deadline is not None and time.perf_counter() > deadline:
+                raise BudgetExceeded(budget, i)
             st = self.toWylieOneStack(str_, length, i)
             stacks.append(st)
 
@@ -1778,7 +2269,21 @@ class Wylie(object):
                 break  # ITER
             if i >= length or self.tib_top(str_[i]) is None:
                 break  # ITER
+        if stats is not None:
+            stats.syllables[str_[orig_i:i]] += 1
+        self.markStacks(stacks, warns)
+        out = ""
+        for st in stacks:
+            out += self.putStackTogether(st)
+        ret = self.ToWylieTsekbar()
+        ret.wylie = out
+        ret.tokens_used = i - orig_i
+        ret.warns = warns
+        return ret
 
+    # Unicode to Wylie: mark the stacks of a tsekbar which are the prefix, suffix and second
+    # suffix (the others are the root and what is stacked with it)
+    def markStacks(self, stacks, warns):
         # figure out if some of these stacks can be prefixes or suffixes (in which case
                 # they don't need their "a" vowels)
         if len(stacks) > 1 and stacks[0].single_cons is not None:
@@ -1810,14 +2315,6 @@ class Wylie(object):
             stacks[root + 1].suff2 = False
         if stacks[0].prefix and self.tib_stack(stacks[0].single_cons + "+" + stacks[1].cons_str):
             stacks[0].dot = True
-        out = ""
-        for st in stacks:
-            out += self.putStackTogether(st)
-        ret = self.ToWylieTsekbar()
-        ret.wylie = out
-        ret.tokens_used = i - orig_i
-        ret.warns = warns
-        return ret
 
     # Unicode to Wylie: one stack at a time
     def toWylieOneStack(self, str_, length, i):  # noqa: C901
@@ -1977,26 +2474,36 @@ class Wylie(object):
         tokens_used = int()
         warns = None
 
-# warn = []
-# print (Wylie().fromWylie("sems can thams cad", warn))
-# print ('\n'.join(warn))
-
-# warn = []
-# print (Wylie().toWylieOptions(u"ཨོཾ་ཨཿཧཱུྂ་བཛྲ་གུ་རུ་པདྨ་སིདྡྷི་ཧཱུྂ༔", warn, True))
-# print ('\n'.join(warn))
-
-# print (Wylie().fromWylie("phyugs zog gi stod nad} ", []))
-
-warn = []
-print (Wylie().toWylie(u"ཨོཾ་ཨཿཧཱུྂ་བཛྲ་གུ་རུ་པདྨ་སིདྡྷི་ཧཱུྂ༔", warn, True))
-print ('\n'.join(warn))
-
-warn = []
-print (Wylie().toWylie(
-    u"༄༅།	།ཞེས་བྱ་བྱ་རྣམས་ཡོད། སྤྱོད་ལྡན་གནས་སུ་སྐྱེ་བའི་རྒྱུ། །འཐབ་འཁྲོལ་གནོད་པ་ཐར་བྱེད་པའོ། །གཟུགས་ཀྱིསལྷག་མྱོས་མེ་ལོང་ཚལ། །རྒྱལ་ཆེན་མིག་མི་བཟང་གནས་སོ། །ཡུལ་འཁོར་\n"+
-    u"སྐྱོང་ནི་ཤར་ཕྱོགས་ཏེ། །ལུས་ངན་བྱང་ཕྱོགས་ལྕང་ལོ་ཅན། །གཞན་ཡང་ཡུལ་པ་འཕགས་པར་སྐྱེས། །སྣ་ཚོགས་གཟུགས་དང་ལྕང་ལོ་ཅན། །ངོས་ལ་ཉིས་བརྒྱ་ལྔ་ཅུ་པ། །གཉའ་ཤིང་འཛིན་སྟེང་གནས་པ་\n"+
-    u"སྟེ༑ ༑དཔག་མེད་བཀོད་པ་ལོངས་སྤྱོད་ལྡན། །དེ་འཁོར་ཀུན་ཏུརྒྱུ་བའི་ལྷ། །བྱེ་བ་ཕྲག་ནི་སུམ་ཅུ་དྲུག །དེ་རྣམས་གནས་པའི་གཞལ་ཡསཁང་། །གཟའ་སྐར་ཞེས་ཀྱང་འཇིག་རྟེན་གྲགས། །ཉི་ཟླ་གཉིས་ནི་\n"+
-    u"ལྷ་གནས་ཏེ། །དཔག་ཚད་ལྔ་ཅུ་གཅིག་དང་བཅས། །གྱེན་འཐུར་འཕང་བའི་མདའ་ཡབ་དང་། །ནང་ན་སྐྱེད་ཚལ་གྲོང་ཁྱེར་དང་། །ལྟེང་ཁས་བརྒྱན་ཅིང་ལོངས་སྤྱོད་ལྡན། །འཁོར་ལོའི་རླུང་གིས་འདྲེན་པ་\n"+
-    u"ཡིན༑ ༑ནམ་ཕྱེད་ཉི་མ་ནུབ་པ་དང་། །ཉི་མ་ཕྱེད་དང་འཆར་དུས་ཅིག །ཉི་མའི་འོད་དང་རང་གྲིབ་ལ། །བརྟེན་ནས་ཟླ་བ་འཕེལ་འགྲིབ་བྱེད། །འདིར་ནི་ཚུལ་ལྡན་བརྩེ་བ་ཅན། །ཁྱད་པར་སྒྲོན་མེ་བྱིན་པའི་\n"+
-    u"མཐུ༑ ༑འཇིག་རྟེན་སྐྱོང་བ་བཞི་པོ་ནི། །ཚུལ་ཁྲིམས་བསོད་ནམས་གཞན་པས་ལྷག །སྣ་ཚོགས་ལོངས་སྤྱོད་བསམ་མི་ཁྱབ། །སེམས་ཀྱི་ཀུན་རྟོག་དགེ་བ་ཡིན། །གྲངས་བཞིན་ཡུལ་ཀྱང་དེ་འདྲར་སྣང་། །འདི་\n", warn, True))
-print ('\n'.join(warn))
+
+#  a Wylie object with the default options, shared by the whole process (see sharedWylie())
+_shared = None
+
+
+#  the process-wide Wylie object with the default options, created on first use
+def sharedWylie():
+    global _shared
+    if _shared is None:
+        _shared = Wylie()
+    return _shared
+
+
+if __name__ == "__main__":
+    # warn = []
+    # print (Wylie().fromWylie("sems can thams cad", warn))
+    # print ('\n'.join(warn))
+
+    # print (Wylie().fromWylie("phyugs zog gi stod nad} ", []))
+
+    warn = []
+    print (Wylie().toWylieOptions(u"ཨོཾ་ཨཿཧཱུྂ་བཛྲ་གུ་རུ་པདྨ་སིདྡྷི་ཧཱུྂ༔", warn, True))
+    print ('\n'.join(warn))
+
+    warn = []
+    print (Wylie().toWylieOptions(
+        u"༄༅།	།ཞེས་བྱ་བྱ་རྣམས་ཡོད། སྤྱོད་ལྡན་གནས་སུ་སྐྱེ་བའི་རྒྱུ། །འཐབ་འཁྲོལ་གནོད་པ་ཐར་བྱེད་པའོ། །གཟུགས་ཀྱིསལྷག་མྱོས་མེ་ལོང་ཚལ། །རྒྱལ་ཆེན་མིག་མི་བཟང་གནས་སོ། །ཡུལ་འཁོར་\n"+
+        u"སྐྱོང་ནི་ཤར་ཕྱོགས་ཏེ། །ལུས་ངན་བྱང་ཕྱོགས་ལྕང་ལོ་ཅན། །གཞན་ཡང་ཡུལ་པ་འཕགས་པར་སྐྱེས། །སྣ་ཚོགས་གཟུགས་དང་ལྕང་ལོ་ཅན། །ངོས་ལ་ཉིས་བརྒྱ་ལྔ་ཅུ་པ། །གཉའ་ཤིང་འཛིན་སྟེང་གནས་པ་\n"+
+        u"སྟེ༑ ༑དཔག་མེད་བཀོད་པ་ལོངས་སྤྱོད་ལྡན། །དེ་འཁོར་ཀུན་ཏུརྒྱུ་བའི་ལྷ། །བྱེ་བ་ཕྲག་ནི་སུམ་ཅུ་དྲུག །དེ་རྣམས་གནས་པའི་གཞལ་ཡསཁང་། །གཟའ་སྐར་ཞེས་ཀྱང་འཇིག་རྟེན་གྲགས། །ཉི་ཟླ་གཉིས་ནི་\n"+
+        u"ལྷ་གནས་ཏེ། །དཔག་ཚད་ལྔ་ཅུ་གཅིག་དང་བཅས། །གྱེན་འཐུར་འཕང་བའི་མདའ་ཡབ་དང་། །ནང་ན་སྐྱེད་ཚལ་གྲོང་ཁྱེར་དང་། །ལྟེང་ཁས་བརྒྱན་ཅིང་ལོངས་སྤྱོད་ལྡན། །འཁོར་ལོའི་རླུང་གིས་འདྲེན་པ་\n"+
+        u"ཡིན༑ ༑ནམ་ཕྱེད་ཉི་མ་ནུབ་པ་དང་། །ཉི་མ་ཕྱེད་དང་འཆར་དུས་ཅིག །ཉི་མའི་འོད་དང་རང་གྲིབ་ལ། །བརྟེན་ནས་ཟླ་བ་འཕེལ་འགྲིབ་བྱེད། །འདིར་ནི་ཚུལ་ལྡན་བརྩེ་བ་ཅན། །ཁྱད་པར་སྒྲོན་མེ་བྱིན་པའི་\n"+
+        u"མཐུ༑ ༑འཇིག་རྟེན་སྐྱོང་བ་བཞི་པོ་ནི། །ཚུལ་ཁྲིམས་བསོད་ནམས་གཞན་པས་ལྷག །སྣ་ཚོགས་ལོངས་སྤྱོད་བསམ་མི་ཁྱབ། །སེམས་ཀྱི་ཀུན་རྟོག་དགེ་བ་ཡིན། །གྲངས་བཞིན་ཡུལ་ཀྱང་དེ་འདྲར་སྣང་། །འདི་\n", warn, True))
+    print ('\n'.join(warn))
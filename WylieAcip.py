@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import io
+import re
+import sys
+from Wylie import sharedWylie
+from WylieSegment import sharedSegmenter
+#  Direct EWTS <-> ACIP transcoding, without going through Unicode.
+#
+#  ACIP spells a tsekbar with the same structure as EWTS: the same letters in the same order,
+#  "+" for non-standard stacks and "-" where EWTS uses "." to separate a prefix from the root.
+#  The stack analysis (which letters stack, prefixes, suffixes) is therefore the same in both
+#  schemes, and a tsekbar is transcoded token by token with the m_acip / m_acip_wylie tables
+#  of Wylie, in one pass and without building any Unicode.  The only structural difference
+#  is the "'" after a vowel, which in ACIP is either a long vowel mark or the letter a-chung:
+#  after i, u or -i it marks a long vowel unless a vowel follows (as in "BU'I"); after any
+#  other vowel it is the a-chung (as in "DGA'"), so EWTS "kA" comes back as "ka'".
+#
+#  [comments] are copied unchanged in both directions; ACIP "@" folio markers become
+#  [comments] in EWTS.  Tokens with no equivalent in the other scheme are copied inside a
+#  [comment] (EWTS to ACIP) or escaped (ACIP to EWTS), with a warning.
+#
+#  Use:
+#      t = AcipTranscoder()
+#      t.wylieToAcip("bsgrubs pa'i g.yag")   # => "BSGRUBS PA'I G-YAG"
+#      t.acipToWylie("SANGS RGYAS,")         # => "sangs rgyas/"
+#
+#  or from the command line:  python WylieAcip.py --to-acip < in.txt > out.txt
+
+#  long forms of the ACIP vowels which take a "'" length mark
+LONG_VOWELS = {"i": "I", "u": "U", "-i": "-I"}
+
+NEWLINES = ("\r\n", "\n", "\r")
+
+
+class AcipTranscoder(object):
+
+    def __init__(self, wylie=None):
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        w = self.wylie
+        self.acip = w.m_acip
+        self.acip_wylie = w.m_acip_wylie
+        tokens = sorted(w.m_acip_wylie, key=lambda t: (-len(t), t))
+        self.acip_pattern = re.compile(u"(?P<tok>" + u"|".join(re.escape(t) for t in tokens) + u")|"
+                                       u"(?P<nl>\r\n|\n|\r)|(?P<comment>\\[)|(?P<folio>@\\S*)|.", re.S)
+        self.acip_vowels = frozenset(t for t, v in w.m_acip_wylie.items() if v in w.m_vowel)
+
+    #  Wylie (EWTS) to ACIP
+    def wylieToAcip(self, str_, warns=None, line=1):
+        w = self.wylie
+        acip = self.acip
+        tokens = w.splitIntoTokens(str_)
+        out = []
+        i = 0
+        while tokens[i] != '':
+            t = tokens[i]
+            a = acip.get(t)
+            if a is not None:
+                out.append(a)
+                i += 1
+                continue
+            if t == "[":
+                start = i
+                nesting = 0
+                while tokens[i] != '':
+                    if tokens[i] == "[":
+                        nesting += 1
+                    elif tokens[i] == "]":
+                        nesting -= 1
+                    i += 1
+                    if nesting == 0:
+                        break
+                else:
+                    w.warnl(warns, line, "Unfinished [non-Wylie stuff].")
+                comment = "".join(tokens[start:i])
+                line += comment.count("\n")
+                out.append(comment)
+                continue
+            if t in NEWLINES:
+                line += 1
+                out.append(t)
+            elif t == "\t":
+                out.append(t)
+            else:
+                w.warnl(warns, line, "No ACIP equivalent for \"" + t + "\".")
+                out.append("[" + t + "]")
+            i += 1
+        return "".join(out)
+
+    #  ACIP to Wylie (EWTS)
+    def acipToWylie(self, str_, warns=None, line=1):  # noqa: C901
+        w = self.wylie
+        acip_wylie = self.acip_wylie
+        match = self.acip_pattern.match
+        out = []
+        # position in 'out' of the last vowel, while a "'" after it can still be a length mark
+        vowel_at = -1
+        pos = 0
+        n = len(str_)
+        while pos < n:
+            m = match(str_, pos)
+            pos = m.end()
+            kind = m.lastgroup
+            t = m.group()
+            if kind == "tok":
+                if t == "'" and vowel_at >= 0 and out[vowel_at] in LONG_VOWELS:
+                    nxt = match(str_, pos)
+                    if nxt is None or nxt.group() not in self.acip_vowels:
+                        out[vowel_at] = LONG_VOWELS[out[vowel_at]]
+                        vowel_at = -1
+                        continue
+                vowel_at = len(out) if t in self.acip_vowels else -1
+                out.append(acip_wylie[t])
+                continue
+            vowel_at = -1
+            if kind == "nl":
+                line += 1
+                out.append(t)
+            elif kind == "comment":
+                end = sharedSegmenter().skipComment(str_, pos)
+                if end == n and not str_.endswith("]"):
+                    w.warnl(warns, line, "Unfinished [comment].")
+                out.append(str_[pos - 1: end])
+                line += str_.count("\n", pos, end)
+                pos = end
+            elif kind == "folio":
+                out.append("[" + t + "]")
+            elif t == "\t":
+                out.append(t)
+            else:
+                w.warnl(warns, line, "Unexpected character \"" + t + "\".")
+                out.append("\\" + t)
+        return "".join(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EWTS <-> ACIP transcoding")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--to-acip", action="store_true", help="Wylie (EWTS) input, ACIP output")
+    group.add_argument("--to-wylie", action="store_true", help="ACIP input, Wylie (EWTS) output")
+    parser.add_argument("files", nargs="*", help="input files (default: standard input)")
+    args = parser.parse_args(argv)
+    t = AcipTranscoder()
+    convert = t.wylieToAcip if args.to_acip else t.acipToWylie
+    warns = []
+    if args.files:
+        for path in args.files:
+            with io.open(path, encoding="utf-8") as f:
+                sys.stdout.write(convert(f.read(), warns))
+    else:
+        sys.stdout.write(convert(sys.stdin.read(), warns))
+    for w in warns:
+        print(w, file=sys.stderr)
+    return 1 if warns else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
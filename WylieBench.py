@@ -0,0 +1,528 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import os
+import subprocess
+import sys
+import time
+#  Benchmarks for the Wylie converter.
+#
+#  Run all of them with:      python WylieBench.py
+#  or only some of them with: python WylieBench.py coldstart ...
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+#  a few verses of real text, repeated to build inputs of any size
+SAMPLE_UNICODE = (
+    u"༄༅། །ཞེས་བྱ་བྱ་རྣམས་ཡོད། སྤྱོད་ལྡན་གནས་སུ་སྐྱེ་བའི་རྒྱུ། །འཐབ་འཁྲོལ་གནོད་པ་ཐར་བྱེད་པའོ། "
+    u"།གཟུགས་ཀྱིས་ལྷག་མྱོས་མེ་ལོང་ཚལ། །རྒྱལ་ཆེན་མིག་མི་བཟང་གནས་སོ། །ཡུལ་འཁོར་སྐྱོང་ནི་ཤར་ཕྱོགས་ཏེ། "
+    u"།ལུས་ངན་བྱང་ཕྱོགས་ལྕང་ལོ་ཅན། །ཨོཾ་ཨཿཧཱུྂ་བཛྲ་གུ་རུ་པདྨ་སིདྡྷི་ཧཱུྂ༔ །བསྒྲུབས་གཡག་རྒྱ་མཚོ། །\n")
+
+#  registered benchmarks, in definition order
+BENCHMARKS = []
+
+
+def benchmark(f):
+    BENCHMARKS.append(f)
+    return f
+
+
+def benchName(f):
+    return f.__name__[len("bench"):].lower()
+
+
+def sampleUnicode(n_chars):
+    reps = n_chars // len(SAMPLE_UNICODE) + 1
+    return (SAMPLE_UNICODE * reps)[:n_chars]
+
+
+def sampleWylie(n_chars):
+    from Wylie import Wylie
+    one = Wylie().toWylie(SAMPLE_UNICODE)
+    reps = n_chars // len(one) + 1
+    return (one * reps)[:n_chars]
+
+
+#  best-of-n wall time of f(), in seconds
+def timeit(f, repeat=5):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        f()
+        t = time.perf_counter() - t
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+#  latency from "import Wylie" to the end of the first conversion, in a fresh interpreter, and
+#  the cost of a Wylie() once the tables of the process are built
+@benchmark
+def benchColdStart(runs=15):
+    child = ("import time; t = time.perf_counter(); from Wylie import Wylie; "
+             "Wylie().fromWylie('bsgrubs'); print(time.perf_counter() - t)")
+    times = []
+    walls = []
+    subprocess.check_output([sys.executable, "-c", child], cwd=HERE)  # write the .pyc
+    for _ in range(runs):
+        w = time.perf_counter()
+        out = subprocess.check_output([sys.executable, "-c", child], cwd=HERE)
+        walls.append(time.perf_counter() - w)
+        times.append(float(out.decode("ascii").strip()))
+    print("cold start: import to first conversion (median of %d runs)" % runs)
+    print("  first conversion  : %8.2f ms   (process: %7.1f ms)" % (median(times) * 1e3, median(walls) * 1e3))
+
+    from Wylie import Wylie
+    build = timeit(Wylie.initHashes, 50)
+    Wylie.loadHashes()
+    shared = timeit(Wylie, 50)
+    print("  initHashes() %.1f us, Wylie() with the tables of the process %.1f us" % (build * 1e6, shared * 1e6))
+
+
+#  specialized engine generated by WylieCompile.py against the reference Wylie class
+@benchmark
+def benchFastEngine(n_chars=200000):
+    from Wylie import Wylie
+    from WylieCompile import differential, loadFast
+    ref = Wylie()
+    fast = loadFast()()
+    uni = sampleUnicode(n_chars)
+    wylie = sampleWylie(n_chars)
+    diffs = differential([uni, wylie], fast, ref)
+    print("specialized engine (%d chars, best of 5): %s" %
+          (n_chars, "identical output" if not diffs else "%d DIFFERENCES" % len(diffs)))
+    for name, f in (("fromWylie", lambda e: e.fromWylie(wylie, [])),
+                    ("toWylie", lambda e: e.toWylieOptions(uni, [], True))):
+        r = timeit(lambda: f(ref))
+        s = timeit(lambda: f(fast))
+        print("  %-9s: reference %7.1f ms, specialized %7.1f ms (x%.2f)" % (name, r * 1e3, s * 1e3, r / s))
+
+
+#  conversion-free segmentation (WylieSegment.py) against full conversion
+@benchmark
+def benchSegment(n_chars=200000):
+    from Wylie import Wylie
+    from WylieSegment import Segmenter
+    w = Wylie()
+    seg = Segmenter(w)
+    uni = sampleUnicode(n_chars)
+    wylie = sampleWylie(n_chars)
+    print("segmentation (%d chars, best of 5)" % n_chars)
+    for name, text, convert in (("Unicode", uni, lambda: w.toWylieOptions(uni, [], True)),
+                                ("EWTS", wylie, lambda: w.fromWylie(wylie, []))):
+        c = timeit(convert)
+        s = timeit(lambda: sum(1 for _ in seg.segment(text)))
+        print("  %-7s: conversion %7.1f ms, segmentation %7.1f ms (x%.1f)" % (name, c * 1e3, s * 1e3, c / s))
+
+
+#  direct EWTS <-> ACIP transcoding against the two-step path through Unicode
+@benchmark
+def benchAcip(n_chars=200000):
+    from Wylie import Wylie
+    from WylieAcip import AcipTranscoder
+    w = Wylie()
+    t = AcipTranscoder(w)
+    wylie = sampleWylie(n_chars)
+    acip = t.wylieToAcip(wylie)
+    print("EWTS <-> ACIP transcoding (%d chars, best of 5)" % n_chars)
+    for name, direct, two_step in (
+            ("EWTS to ACIP", lambda: t.wylieToAcip(wylie),
+             lambda: t.wylieToAcip(w.toWylie(w.fromWylie(wylie, [])))),
+            ("ACIP to EWTS", lambda: t.acipToWylie(acip),
+             lambda: w.toWylie(w.fromWylie(t.acipToWylie(acip), [])))):
+        d = timeit(direct)
+        s = timeit(two_step)
+        print("  %s: direct %7.1f ms, through Unicode %7.1f ms (x%.1f)" % (name, d * 1e3, s * 1e3, s / d))
+
+
+#  EWTS canonicalization against the round trip toWylie(fromWylie(x))
+@benchmark
+def benchCanonical(n_chars=200000):
+    from Wylie import Wylie
+    from WylieCanonical import WylieCanonicalizer
+    from WylieHarness import InputGenerator
+    w = Wylie()
+    gen = InputGenerator(1, w)
+    # random syllables, few of them repeated; those which the round trip cannot convert
+    # (toWylie() raises on a few stacks) are left out
+    syllables = []
+    size = 0
+    while size < n_chars:
+        syl = gen.syllable()
+        try:
+            w.toWylie(w.fromWylie(syl, []))
+        except Exception:
+            continue
+        syllables.append(syl)
+        size += len(syl) + 1
+    print("EWTS canonicalization (%d chars, best of 5)" % n_chars)
+    for name, wylie in (("sample", sampleWylie(n_chars)), ("varied", " ".join(syllables))):
+        t_round = timeit(lambda: w.toWylie(w.fromWylie(wylie, [])))
+        t_cold = timeit(lambda: WylieCanonicalizer(w).canonicalize(wylie, []))
+        c = WylieCanonicalizer(w)
+        t_warm = timeit(lambda: c.canonicalize(wylie, []))
+        print("  %-6s: round trip %7.1f ms, canonicalizer %7.1f ms (x%.1f), with a warm cache %7.1f ms (x%.1f)" %
+              (name, t_round * 1e3, t_cold * 1e3, t_round / t_cold, t_warm * 1e3, t_round / t_warm))
+
+
+#  validation without output against full conversion
+@benchmark
+def benchValidate(n_chars=200000):
+    from Wylie import Wylie
+    from WylieValidate import Validator
+    w = Wylie()
+    uni = sampleUnicode(n_chars)
+    wylie = sampleWylie(n_chars)
+    print("validation (%d chars, best of 5)" % n_chars)
+    for name, convert, validate in (
+            ("Unicode", lambda: w.toWylieOptions(uni, [], True), lambda v: v.validateUnicode(uni, [])),
+            ("EWTS", lambda: w.fromWylie(wylie, []), lambda v: v.validateWylie(wylie, []))):
+        c = timeit(convert)
+        cold = timeit(lambda: validate(Validator(w)))
+        v = Validator(w)
+        warm = timeit(lambda: validate(v))
+        print("  %-7s: conversion %7.1f ms, validation %7.1f ms (x%.1f), warm %7.1f ms (x%.1f)" %
+              (name, c * 1e3, cold * 1e3, c / cold, warm * 1e3, c / warm))
+
+
+#  cost of collecting syllable and stack statistics during the conversion
+@benchmark
+def benchStats(n_chars=200000):
+    from Wylie import Wylie, ConversionStats
+    w = Wylie()
+    uni = sampleUnicode(n_chars)
+    wylie = sampleWylie(n_chars)
+    print("statistics (%d chars, best of 9)" % n_chars)
+    for name, convert in (("toWylie", lambda stats: w.toWylieOptions(uni, [], True, stats=stats)),
+                          ("fromWylie", lambda stats: w.fromWylie(wylie, [], stats=stats))):
+        plain = timeit(lambda: convert(None), 9)
+        counted = timeit(lambda: convert(ConversionStats()), 9)
+        stats = ConversionStats()
+        convert(stats)
+        counts = timeit(lambda: ConversionStats().merge(stats).counts(), 9)
+        print("  %-9s: plain %7.1f ms, with statistics %7.1f ms (%+.1f%%), counts() %5.1f ms" %
+              (name, plain * 1e3, counted * 1e3, (counted / plain - 1) * 100, counts * 1e3))
+
+
+#  a commentary document: short EWTS quotations in long English [comments]
+def sampleCommentary(n_chars):
+    paragraph = ("[The commentary explains that the first line [of the verse] names the four kings, "
+                 "and that the second gives their direction; see the note on \\u0f40 (ka) above. " * 6 +
+                 "]\n")
+    one = "rgyal chen bzhi ni/ " + paragraph + "shar phyogs yul 'khor srung/ " + paragraph
+    reps = n_chars // len(one) + 1
+    return (one * reps)[:n_chars]
+
+
+#  fromWylie on mostly-commentary documents, where [comments] are copied a run at a time
+@benchmark
+def benchComments(n_chars=200000):
+    from Wylie import Wylie
+    w = Wylie()
+    print("fromWylie of mostly-commentary EWTS (%d chars, best of 5)" % n_chars)
+    for name, text in (("commentary", sampleCommentary(n_chars)), ("Tibetan", sampleWylie(n_chars))):
+        tokens = w.splitIntoTokens(text).index('')
+        t = timeit(lambda: w.fromWylie(text, []))
+        print("  %-10s: %7.1f ms, %5.2f MB/s, %6d tokens" % (name, t * 1e3, n_chars / t / 1e6, tokens))
+
+
+#  suggestions for misspelled syllables: deletion index against a scan of the inventory
+@benchmark
+def benchSuggest(n_queries=200):
+    import tracemalloc
+    from Wylie import Wylie
+    from WylieSuggest import Suggester, editDistance, suggestionIndex, _indexes
+    w = Wylie()
+    _indexes.clear()
+    tracemalloc.start()
+    start = time.time()
+    suggestionIndex(w)
+    build = time.time() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    s = Suggester(w)
+    # one typo per syllable: a letter dropped, doubled, replaced or swapped
+    words = sorted(set(sampleWylie(20000).split()))
+    typos = [lambda x: x[1:], lambda x: x + x[-1], lambda x: x[:-1] + "z", lambda x: x[1] + x[0] + x[2:]]
+    queries = [typos[n % 4](x) for n, x in enumerate(words) if len(x) > 2][:n_queries]
+    print("suggestions for %d misspelled syllables (k = 5, %d valid syllables)" % (len(queries), len(s.syllables)))
+    print("  index     : built in %.2f s, %.1f MB" % (build, size / 1e6))
+
+    def query():
+        s.cache.clear()
+        for q in queries:
+            s.suggest(q)
+    cold = timeit(query)
+    warm = timeit(lambda: [s.suggest(q) for q in queries])
+    scan = timeit(lambda: [sorted(editDistance(q, c, 2) for c in s.syllables) for q in queries[:10]], 1) / 10
+    print("  per query : index %7.1f us, cached %5.2f us, scan of the inventory %7.1f us" %
+          (cold / len(queries) * 1e6, warm / len(queries) * 1e6, scan * 1e6))
+
+
+#  dictionary sorting: precomputed collation keys against a comparator analyzing both strings
+@benchmark
+def benchCollate(n_words=100000, n_compared=5000):
+    import functools
+    import random
+    from Wylie import Wylie
+    from WylieCollate import Collator
+    w = Wylie()
+    syllables = sampleWylie(50000).split()
+    rng = random.Random(1)
+    words = [" ".join(rng.choice(syllables) for _ in range(rng.randint(1, 3))) for _ in range(n_words)]
+    print("Tibetan alphabetical sort of %d EWTS headwords (best of 3)" % n_words)
+    cold = timeit(lambda: Collator(w).keys(words), 3)
+    c = Collator(w)
+    keys = c.keys(words)
+    warm = timeit(lambda: c.keys(words), 3)
+    by_key = timeit(lambda: sorted(keys), 3)
+    print("  keys      : %7.1f ms cold, %7.1f ms cached (%.1f bytes per headword)" %
+          (cold * 1e3, warm * 1e3, sum(len(k) for k in keys) / float(n_words)))
+    print("  key sort  : %7.1f ms" % (by_key * 1e3))
+
+    fresh = Collator(w)
+
+    def compare(a, b):
+        fresh.unicode_cache.clear()
+        fresh.wylie_cache.clear()
+        ka = fresh.key(a)
+        kb = fresh.key(b)
+        return (ka > kb) - (ka < kb)
+    some = words[:n_compared]
+    t = timeit(lambda: sorted(some, key=functools.cmp_to_key(compare)), 1)
+    print("  comparator: %7.1f ms for %d headwords (analysis on every comparison)" % (t * 1e3, n_compared))
+
+
+#  hostile inputs, as functions of a size n
+ADVERSARIAL = (
+    ("fromWylie", "repeated spaces", lambda n: "ka" + " " * n + "ka"),
+    ("fromWylie", "spaces after newlines", lambda n: "ka\n" * (n // 8) + " " * n + "ka"),
+    ("fromWylie", "deep [ nesting", lambda n: "[" * n + "]" * n),
+    ("fromWylie", "unfinished [", lambda n: "[" * n),
+    ("fromWylie", "+ chain", lambda n: "k" + "+k" * n + "a"),
+    ("fromWylie", "^ run", lambda n: "k" + "^" * n + "a"),
+    ("fromWylie", "superscript chain", lambda n: "rk" * n + "a"),
+    ("fromWylie", "stacks in one tsekbar", lambda n: "k" * n),
+    ("fromWylie", "backslashes", lambda n: "\\" * n),
+    ("fromWylie", "invalid escapes", lambda n: "ka \\UFFFFFFFF \\uD800 " * (n // 20)),
+    ("fromWylie", "invalid escapes in [", lambda n: "[" + "a \\UFFFFFFFF " * (n // 14) + "] ka"),
+    ("toWylie", "repeated spaces", lambda n: u"\u0f40" + " " * n + "ab"),
+    ("toWylie", "stacks in one tsekbar", lambda n: u"\u0f40" * n),
+    ("toWylie", "subjoined chain", lambda n: u"\u0f40" + u"\u0f90" * n),
+    ("toWylie", "stray vowel signs", lambda n: u"\u0f72" * n),
+)
+
+
+#  pathological inputs at two sizes: the time ratio should stay close to the size ratio
+@benchmark
+def benchAdversarial(n=2500, factor=4):
+    from Wylie import Wylie
+    w = Wylie()
+    print("adversarial inputs (n = %d and %d, best of 3)" % (n, n * factor))
+    for direction, name, make in ADVERSARIAL:
+        if direction == "fromWylie":
+            def convert(s):
+                return w.fromWylie(s, [])
+        else:
+            def convert(s):
+                return w.toWylieOptions(s, [], True)
+        small = make(n)
+        large = make(n * factor)
+        a = timeit(lambda: convert(small), 3)
+        b = timeit(lambda: convert(large), 3)
+        ratio = b / a if a > 0 else 0.0
+        print("  %-9s %-22s: %8.2f ms, %8.2f ms  (x%.1f%s)" %
+              (direction, name, a * 1e3, b * 1e3, ratio, "  NOT LINEAR" if ratio > factor * 2 else ""))
+
+
+#  number of syllables (tsekbars) in a text, to report memory per syllable
+def countSyllables(text, unicode):
+    from WylieSegment import sharedSegmenter
+    seg = sharedSegmenter()
+    spans = seg.segmentUnicode(text) if unicode else seg.segmentWylie(text)
+    return max(1, sum(1 for _ in spans))
+
+
+def convertSample(direction, n_chars):
+    from Wylie import Wylie
+    w = Wylie()
+    if direction == "fromWylie":
+        text = sampleWylie(n_chars)
+        return text, lambda: w.fromWylie(text, [])
+    text = sampleUnicode(n_chars)
+    return text, lambda: w.toWylieOptions(text, [], True)
+
+
+#  peak traced memory (tracemalloc) and peak number of live memory blocks of one conversion
+def tracedMemory(f):
+    import gc
+    import tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    result = f()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    del result
+    # live blocks, sampled on every Python call and return during a second run
+    gc.collect()
+    base_blocks = sys.getallocatedblocks()
+    peak_blocks = [base_blocks]
+
+    def sample(frame, event, arg):
+        n = sys.getallocatedblocks()
+        if n > peak_blocks[0]:
+            peak_blocks[0] = n
+
+    sys.setprofile(sample)
+    try:
+        f()
+    finally:
+        sys.setprofile(None)
+    return peak, peak_blocks[0] - base_blocks
+
+
+#  in a fresh interpreter: growth of the peak resident set size caused by one conversion
+def rssGrowth(direction, n_chars):
+    child = ("import resource, sys; sys.path.insert(0, %r); import WylieBench\n"
+             "def hwm():\n"
+             "    try:\n"
+             "        for line in open('/proc/self/status'):\n"
+             "            if line.startswith('VmHWM:'):\n"
+             "                return int(line.split()[1]) * 1024\n"
+             "    except IOError:\n"
+             "        pass\n"
+             "    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024\n"
+             "text, f = WylieBench.convertSample(%r, %d)\n"
+             "before = hwm(); f(); print(hwm() - before)\n" % (HERE, direction, n_chars))
+    out = subprocess.check_output([sys.executable, "-c", child], cwd=HERE)
+    return int(out.decode("ascii").strip())
+
+
+#  memory footprint of both directions at several input sizes
+@benchmark
+def benchMemory(sizes=(10000, 100000, 300000)):
+    print("memory footprint of one conversion (tracemalloc peak, peak live blocks, peak RSS growth)")
+    for direction in ("fromWylie", "toWylie"):
+        for n_chars in sizes:
+            text, f = convertSample(direction, n_chars)
+            syllables = countSyllables(text, direction == "toWylie")
+            peak, blocks = tracedMemory(f)
+            rss = rssGrowth(direction, n_chars)
+            print("  %-9s %8d chars: peak %8.1f KiB (%6.1f B/char, %7.1f B/syllable), %8d blocks, "
+                  "RSS +%8.1f KiB" % (direction, n_chars, peak / 1024.0, float(peak) / n_chars,
+                                      float(peak) / syllables, blocks, rss / 1024.0))
+
+
+#  peak memory of a conversion returning its output, and writing it to a sink
+@benchmark
+def benchSink(sizes=(100000, 300000)):
+    from Wylie import Wylie
+    w = Wylie()
+    discard = len
+
+    def convert(direction, text, sink=None):
+        if direction == "fromWylie":
+            return w.fromWylie(text, [], sink=sink)
+        return w.toWylieOptions(text, [], True, sink=sink)
+
+    print("output sink (tracemalloc peak, returned string vs written in batches)")
+    for direction in ("fromWylie", "toWylie"):
+        for n_chars in sizes:
+            text = sampleWylie(n_chars) if direction == "fromWylie" else sampleUnicode(n_chars)
+            peak_returned = tracedMemory(lambda: convert(direction, text))[0]
+            peak_sunk = tracedMemory(lambda: convert(direction, text, discard))[0]
+            print("  %-9s %8d chars: returned %8.1f KiB, sink %8.1f KiB" %
+                  (direction, n_chars, peak_returned / 1024.0, peak_sunk / 1024.0))
+
+
+#  unique memory of forked workers, with and without the prefork preload hook
+@benchmark
+def benchPrefork(workers=4, n_chars=20000):
+    print("prefork workers (%d), unique memory (USS) per worker after converting %d chars" % (workers, n_chars))
+    for preload in (False, True):
+        child = ("import gc, sys\n"
+                 "sys.path.insert(0, %r)\n"
+                 "import WyliePrefork, WylieBench\n"
+                 "from Wylie import sharedWylie\n"
+                 "text = WylieBench.sampleWylie(%d)\n"
+                 "if %r:\n"
+                 "    WyliePrefork.preload()\n"
+                 "else:\n"
+                 "    sharedWylie()\n"
+                 "def work():\n"
+                 "    w = sharedWylie()\n"
+                 "    w.toWylie(w.fromWylie(text, []))\n"
+                 "    gc.collect()\n"
+                 "print(' '.join(str(u) for u in WyliePrefork.measureWorkers(work, %d)))\n"
+                 % (HERE, n_chars, preload, workers))
+        out = subprocess.check_output([sys.executable, "-c", child], cwd=HERE).decode("ascii").split()
+        if not out or not int(out[0]):
+            print("  /proc/<pid>/smaps_rollup is not available")
+            return
+        values = [int(x) for x in out]
+        print("  %-11s: %8.1f KiB per worker" % ("preload" if preload else "no preload",
+                                                 median(values) / 1024.0))
+
+
+#  a tenant delta: an extra stack and an extra punctuation mark, different for every tenant
+def tenantDelta(k):
+    mark = chr(0xf0000 + k)
+    return {"m_tib_stacks": ["k+m+%d" % k], "m_other": {"||%d" % k: mark}, "m_tib_other": {mark: "||%d" % k}}
+
+
+#  memory and speed of table variants: copy-on-write overlays against full table copies
+@benchmark
+def benchVariants(n_variants=200, n_chars=100000):
+    import tracemalloc
+    from Wylie import Wylie
+    from WylieOverlay import variant
+    Wylie.loadHashes()
+
+    def fullCopy(k):
+        cls = type("Full%d" % k, (Wylie,), {"_tables_ready": True})
+        cls.initHashes()
+        for table, changes in tenantDelta(k).items():
+            if isinstance(changes, dict):
+                getattr(cls, table).update(changes)
+            else:
+                getattr(cls, table).extend(changes)
+        return cls
+
+    print("%d table variants (memory per variant, fromWylie of %d chars)" % (n_variants, n_chars))
+    for name, make in (("overlay", lambda k: variant(tenantDelta(k))), ("full copy", fullCopy)):
+        tracemalloc.start()
+        variants = [make(k) for k in range(n_variants)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("  %-9s: %7.1f KiB per variant" % (name, size / 1024.0 / len(variants)))
+    text = sampleWylie(n_chars)
+    base = Wylie()
+    tenant = variant(tenantDelta(0))()
+    t_base = timeit(lambda: base.fromWylie(text, []))
+    t_tenant = timeit(lambda: tenant.fromWylie(text, []))
+    print("  conversion: base %.1f ms, overlay variant %.1f ms (x%.2f)" %
+          (t_base * 1e3, t_tenant * 1e3, t_tenant / t_base))
+
+
+def main(argv=None):
+    names = [benchName(f) for f in BENCHMARKS]
+    parser = argparse.ArgumentParser(description="Wylie converter benchmarks")
+    parser.add_argument("names", nargs="*", choices=names + [[]], metavar="name",
+                        help="benchmarks to run: " + ", ".join(names))
+    args = parser.parse_args(argv)
+    sys.path.insert(0, HERE)
+    for f in BENCHMARKS:
+        if not args.names or benchName(f) in args.names:
+            f()
+
+
+if __name__ == "__main__":
+    main()
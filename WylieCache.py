@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import Wylie as _wylie_module
+from Wylie import Wylie
+#  Persistent on-disk cache of conversion results, backed by a local SQLite file.
+#
+#  Entries are keyed by a hash of the input text, the conversion direction, the options
+#  that influence the output (check, check_strict, fix_spacing, escape) and the converter
+#  version, and hold the converted text and the warnings.  Re-running a pipeline over
+#  unchanged documents then costs one indexed lookup per document.
+#
+#  The cache can be bounded in size: when the stored outputs exceed 'max_bytes', the
+#  least recently used entries are evicted.  The last use of the entries read is recorded in
+#  memory and written in batches (with the next store, every TOUCH_BATCH hits, and on close),
+#  so that reads never leave a write transaction open on the file.
+#
+#  Use:
+#      with WylieCache("conversions.sqlite", max_bytes=1 << 30) as cache:
+#          warns = []
+#          uni = cache.fromWylie("sems can thams cad", warns)
+
+
+class WylieCache(object):
+    #  evict down to this fraction of max_bytes, so that eviction does not run on every store
+    LOW_WATER = 0.9
+    #  hits whose last use is kept in memory before being written
+    TOUCH_BATCH = 256
+
+    def __init__(self, path, max_bytes=None, wylie=None):
+        self.wylie = wylie if wylie is not None else Wylie()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        #  key => time of the last use not written yet
+        self.touched = {}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                        "key BLOB PRIMARY KEY, output TEXT, warns TEXT, size INTEGER, used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self.db.commit()
+        self.total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.flushTouched()
+            self.db.commit()
+            self.db.close()
+
+    #  write the last use of the entries read since the last flush (called with the lock held;
+    #  the caller commits)
+    def flushTouched(self):
+        if self.touched:
+            self.db.executemany("UPDATE entries SET used = ? WHERE key = ?",
+                                [(used, key) for key, used in self.touched.items()])
+            self.touched.clear()
+
+    #  the cache key: everything that can influence the output, then the text itself
+    def key(self, direction, str_, escape=None):
+        w = self.wylie
+        h = hashlib.sha256()
+        h.update(("%s\0%s\0%d%d%d\0%s\0" % (_wylie_module.__version__, direction, w.check,
+                                             w.check_strict, w.fix_spacing, escape)).encode("utf-8"))
+        h.update(str_.encode("utf-8", "surrogatepass"))
+        return h.digest()
+
+    #  Converts a Wylie (EWTS) string to unicode, like Wylie.fromWylie()
+    def fromWylie(self, str_, warns=None):
+        return self.convert("fromWylie", str_, warns, None,
+                            lambda w, ws: w.fromWylie(str_, ws))
+
+    #  Converts from Unicode strings to Wylie, like Wylie.toWylie()
+    def toWylie(self, str_):
+        return self.toWylieOptions(str_, None, True)
+
+    #  Converts from Unicode strings to Wylie, like Wylie.toWylieOptions()
+    def toWylieOptions(self, str_, warns, escape):
+        return self.convert("toWylie", str_, warns, escape,
+                            lambda w, ws: w.toWylieOptions(str_, ws, escape))
+
+    #  look up a conversion result, or compute and store it
+    def convert(self, direction, str_, warns, escape, compute):
+        key = self.key(direction, str_, escape)
+        with self.lock:
+            row = self.db.execute("SELECT output, warns FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                self.touched[key] = time.time()
+                if len(self.touched) >= self.TOUCH_BATCH:
+                    self.flushTouched()
+                    self.db.commit()
+        if row is not None:
+            out = row[0]
+            for w in json.loads(row[1]):
+                self.wylie.warn(warns, w)
+            return out
+
+        # print_warnings must not fire twice for the same warning, so collect them silently
+        # with a copy of the converter, and replay them through warn().  The shared converter
+        # is never modified, so threads can convert concurrently.
+        ws = []
+        quiet = copy.copy(self.wylie)
+        quiet.print_warnings = False
+        out = compute(quiet, ws)
+        for w in ws:
+            self.wylie.warn(warns, w)
+        self.store(key, out, ws)
+        return out
+
+    def store(self, key, out, ws):
+        size = len(out) + sum(len(w) for w in ws)
+        with self.lock:
+            self.misses += 1
+            self.flushTouched()
+            old = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total -= old[0]
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                            (key, out, json.dumps(ws), size, time.time()))
+            self.total += size
+            if self.max_bytes is not None and self.total > self.max_bytes:
+                self.evict(int(self.max_bytes * self.LOW_WATER))
+            self.db.commit()
+
+    #  drop least recently used entries until the total size is at most 'target'
+    #  (called with the lock held)
+    def evict(self, target):
+        while self.total > target:
+            rows = self.db.execute("SELECT key, size FROM entries ORDER BY used LIMIT 256").fetchall()
+            if not rows:
+                self.total = 0
+                break
+            for key, size in rows:
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total -= size
+                if self.total <= target:
+                    break
+
+    #  remove all entries
+    def clear(self):
+        with self.lock:
+            self.touched.clear()
+            self.db.execute("DELETE FROM entries")
+            self.db.commit()
+            self.total = 0
+
+    def stats(self):
+        with self.lock:
+            count = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"entries": count, "bytes": self.total, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import io
+import sys
+from Wylie import WarningAggregator, sharedWylie
+from WylieSegment import Segmenter
+#  Single-pass EWTS canonicalization (Wylie -> canonical Wylie).
+#
+#  Every tsekbar is re-emitted in the canonical spelling that toWylie() gives: no redundant
+#  "+" in standard stacks, "." only where a prefix would otherwise be ambiguous, "g+h" for
+#  "gh", "'" for typographical quotes...  Everything between tsekbars (punctuation, spaces,
+#  line breaks, [comments] and escapes) is copied unchanged.
+#
+#  The text is not converted as a whole: it is segmented in one pass (see WylieSegment), and
+#  each distinct tsekbar is parsed once by fromWylieOneTsekbar(), which also gives its
+#  warnings.  Its canonical form is written from the stacks of that parse: each distinct stack
+#  is analyzed once as toWylieOneStack() reads it (with its spellings by putStackTogether()),
+#  and per tsekbar only the prefix / suffix marks of markStacks() run, so the result is the one the round trip
+#  toWylie(fromWylie(x)) would give, without re-reading the tsekbar from Unicode.  Tsekbars
+#  whose stacks toWylie() would split differently (and non-tsekbar tokens) take the round
+#  trip.  Later occurrences of a tsekbar are a dict lookup.
+#
+#  Use:
+#      c = WylieCanonicalizer()
+#      c.canonicalize(u"bsgrub pa’i g+har k+ya")   # => "bsgrub pa'i g+har kya"
+
+#  distinct tsekbars remembered; the cache is cleared when it grows past this
+MAX_CACHE = 100000
+
+
+#  The canonical spellings of one stack, as putStackTogether() writes it: 'plain' for a root
+#  (with its "a"), 'bare' as a prefix or suffix
+class StackForm(object):
+
+    def __init__(self, st, wylie):
+        self.single_cons = st.single_cons
+        self.cons_str = st.cons_str
+        self.visarga = st.visarga
+        self.plain = wylie.putStackTogether(st)
+        st.suffix = True
+        self.bare = wylie.putStackTogether(st)
+        st.suffix = False
+
+
+#  the marks which markStacks() sets on a stack of one tsekbar
+class StackMarks(object):
+    __slots__ = ("single_cons", "cons_str", "prefix", "suffix", "suff2", "dot")
+
+    def __init__(self, form):
+        self.single_cons = form.single_cons
+        self.cons_str = form.cons_str
+        self.prefix = self.suffix = self.suff2 = self.dot = False
+
+
+class WylieCanonicalizer(object):
+
+    def __init__(self, wylie=None):
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        self.segmenter = Segmenter(self.wylie)
+        self.cache = {}
+        #  Unicode of a stack => its StackForm, or None if toWylie() reads it differently
+        self.stack_cache = {}
+
+    #  the StackForm of one stack parsed by fromWylieOneStack(), or None
+    def stackForm(self, uni):
+        if uni in self.stack_cache:
+            return self.stack_cache[uni]
+        w = self.wylie
+        ret = None
+        if uni and w.tib_top(uni[0]) is not None:
+            try:
+                st = w.toWylieOneStack(uni, len(uni), 0)
+                if st.tokens_used == len(uni):
+                    ret = StackForm(st, w)
+            except Exception:
+                pass
+        if len(self.stack_cache) >= MAX_CACHE:
+            self.stack_cache.clear()
+        self.stack_cache[uni] = ret
+        return ret
+
+    #  The canonical form of a tsekbar from the stacks of its parse, or None.  A visarga ends a
+    #  tsekbar for toWylie(), so it is only allowed on the last stack.
+    def fromStacks(self, stacks):
+        forms = []
+        marks = []
+        last = len(stacks) - 1
+        for n, stack in enumerate(stacks):
+            form = self.stackForm(stack.uni_string)
+            if form is None or (form.visarga and n < last):
+                return None
+            forms.append(form)
+            marks.append(StackMarks(form))
+        self.wylie.markStacks(marks, [])
+        out = []
+        for form, m in zip(forms, marks):
+            out.append(form.bare if m.prefix or m.suffix or m.suff2 else form.plain)
+            if m.dot:
+                out.append(".")
+        return "".join(out)
+
+    #  (canonical form, warnings) of one tsekbar, given as its normalized key
+    def tsekbar(self, key):
+        ret = self.cache.get(key)
+        if ret is not None:
+            return ret
+        w = self.wylie
+        tokens = w.splitIntoTokens(key)
+        # usually one tsekbar for fromWylie() too, but it can end one earlier (after a visarga...)
+        parts = []
+        tb_warns = []
+        stacks = []
+        single = True
+        i = 0
+        while tokens[i] != '':
+            t = tokens[i]
+            if w.vowel(t) is not None or w.consonant(t) is not None:
+                single = single and not parts
+                tb = w.fromWylieOneTsekbar(tokens, i, stacks=stacks)
+                parts.append(tb.uni_string)
+                tb_warns.extend(tb.warns)
+                i += tb.tokens_used
+            else:
+                single = False
+                parts.append(w.fromWylie(t, []))
+                i += 1
+        canonical = self.fromStacks(stacks) if single and parts else None
+        if canonical is None:
+            canonical = self.roundTrip("".join(parts), key)
+        if len(self.cache) >= MAX_CACHE:
+            self.cache.clear()
+        ret = self.cache[key] = (canonical, tb_warns)
+        return ret
+
+    #  the canonical form of tsekbar 'key' from its Unicode 'uni', as toWylie() reads it back
+    def roundTrip(self, uni, key):
+        w = self.wylie
+        try:
+            if uni and w.tib_top(uni[0]) is not None:
+                st = w.toWylieOneTsekbar(uni, len(uni), 0)
+                if st.tokens_used == len(uni):
+                    return st.wylie
+            # stray signs which toWylie() does not read as one tsekbar
+            return w.toWylieOptions(uni, [], True)
+        except Exception:
+            # toWylie() cannot read it back (e.g. "^" on a stack without a caret form): keep
+            # the tsekbar as it is
+            return key
+
+    #  the canonical EWTS of 'str_'; warnings are those fromWylie() reports for the tsekbars
+    def canonicalize(self, str_, warns=None, line=1):
+        w = self.wylie
+        aggregate = isinstance(warns, WarningAggregator)
+        out = []
+        pos = 0
+        for start, end, key in self.segmenter.segmentWylie(str_):
+            if start > pos:
+                out.append(str_[pos:start])
+                line += str_.count("\n", pos, start)
+            canonical, tb_warns = self.tsekbar(key)
+            out.append(canonical)
+            if tb_warns and warns is not None:
+                word = str_[start:end]
+                for warning in tb_warns:
+                    if aggregate:
+                        w.warnAggregated(warns, line, word, warning)
+                    else:
+                        w.warnl(warns, line, "\"" + word + "\": " + warning)
+            pos = end
+        out.append(str_[pos:])
+        return "".join(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rewrite EWTS text in canonical form")
+    parser.add_argument("files", nargs="*", help="input files (default: standard input)")
+    args = parser.parse_args(argv)
+    c = WylieCanonicalizer()
+    warns = []
+    if args.files:
+        for path in args.files:
+            with io.open(path, encoding="utf-8") as f:
+                sys.stdout.write(c.canonicalize(f.read(), warns))
+    else:
+        sys.stdout.write(c.canonicalize(sys.stdin.read(), warns))
+    for w in warns:
+        print(w, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import io
+import sys
+from Wylie import sharedWylie
+from WylieSegment import TIBETAN, Segmenter
+#  Tibetan alphabetical order, as binary sort keys.
+#
+#  Dictionaries sort syllables by their root letter, not by their first letter: "dkar" and
+#  "bsgrubs" are found under "k" and "g".  Under a root, the order is:
+#    - the root with no prefix and no superscript, then with a prefix, then with a superscript,
+#      then with both ("ka", "dka", "bka", "rka", "ska", "brka", "bska")
+#    - then the prefix and superscript letters, in alphabetical order
+#    - then the subscripts, ya, ra, la, wa ("ka", "kya", "kra", "kla")
+#    - then the vowel (none, i, u, e, o), the suffix and the second suffix.
+#  Strings are compared syllable by syllable, so every word starting with "ka" comes before
+#  "kag".
+#
+#  The syllable structure is the one toWylie() finds (toWylieOneStack(), and the prefix,
+#  suffix and second suffix marks of markStacks(), which resolves three-letter syllables with
+#  m_ambiguous_key).  Each distinct syllable is analyzed once and its key cached, so the key of
+#  a string costs one segmentation pass (see WylieSegment) and a dict lookup per syllable.
+#  The key of a syllable is the bytes:
+#      root, group (1 for a prefix, + 2 for a superscript), superscript, prefix,
+#      subscripts..., vowels..., finals..., then the stacks after the root (letters, vowels,
+#      finals), then 0
+#  Letters are 0x40 and up (in the order of the Unicode block, which is the alphabetical
+#  order), finals 0x20 to 0x3f, vowels 0x01 (none) to 0x1f, so the keys of two strings compare
+#  like their syllables, and can be stored and compared as plain bytes (in a database column,
+#  an external sort...).  Punctuation, spaces, digits and anything else outside syllables is
+#  ignored.
+#
+#  Use:
+#      c = Collator()
+#      c.sort([u"bsgrubs", u"dkar po", u"ka ba"])     # => ["ka ba", "dkar po", "bsgrubs"]
+#      keys = c.keys(headwords)                    # Unicode or EWTS, one key per string
+#
+#  or from the command line:  python WylieCollate.py headwords.txt > sorted.txt
+
+#  distinct syllables remembered per script; the cache is cleared when it grows past this
+MAX_CACHE = 100000
+
+#  the subscripts, in their traditional order
+SUBSCRIPTS = ("y", "r", "l", "w")
+
+NO_VOWEL = 0x01
+LETTER = 0x40
+
+
+class Collator(object):
+
+    def __init__(self, wylie=None):
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        self.segmenter = Segmenter(self.wylie)
+        self.unicode_cache = {}
+        self.wylie_cache = {}
+        self.initRanks()
+
+    #  byte values of the letters, subscripts, vowels and finals (in EWTS), from the tables
+    def initRanks(self):
+        w = self.wylie
+        self.letters = {}
+        # "a" (the a-chen carrying a vowel) is in m_vowel
+        for wylie, uni in list(w.m_consonant.items()) + [("a", w.m_vowel["a"])]:
+            self.letters[wylie] = LETTER + min(ord(uni[0]) - 0x0f40, 0x3e)
+        self.subscripts = dict((x, LETTER + n) for n, x in enumerate(SUBSCRIPTS))
+        for wylie, rank in self.letters.items():
+            if wylie not in self.subscripts:
+                self.subscripts[wylie] = rank + len(SUBSCRIPTS)
+        vowels = sorted(set(uni for wylie, uni in w.m_vowel.items() if wylie != "a"))
+        self.vowels = dict((wylie, NO_VOWEL + 1 + vowels.index(uni))
+                           for wylie, uni in w.m_vowel.items() if wylie != "a")
+        finals = sorted(set(uni for wylie, uni in w.m_final_uni.items() if wylie != "^"))
+        self.finals = dict((wylie, 0x20 + finals.index(uni))
+                           for wylie, uni in w.m_final_uni.items() if wylie != "^")
+
+    #  rank of a letter of a stack; stacks like "k+Sh" which have their own code point are
+    #  ranked by their first letter
+    def letter(self, x):
+        ret = self.letters.get(x)
+        if ret is None:
+            ret = self.letters.get(x.split("+")[0], LETTER + 0x3f)
+        return ret
+
+    #  the vowels and finals of a stack
+    def signs(self, st):
+        ret = [self.vowels.get(v, 0x1f) for v in st.vowels] or [NO_VOWEL]
+        ret.extend(self.finals.get(f, 0x3f) for f in st.finals)
+        return ret
+
+    #  The key of one normalized Unicode tsekbar.  Signs which no letter carries (a stray
+    #  vowel sign) are skipped.
+    def syllableKey(self, syl):
+        ret = self.unicode_cache.get(syl)
+        if ret is not None:
+            return ret
+        w = self.wylie
+        n = len(syl)
+        stacks = []
+        i = 0
+        key = []
+        try:
+            while i < n:
+                if w.tib_top(syl[i]) is None:
+                    i += 1
+                    continue
+                st = w.toWylieOneStack(syl, n, i)
+                stacks.append(st)
+                i += st.tokens_used
+        except Exception:
+            # toWylie() cannot read it either (e.g. a stray tsa-phru): its letters, in order
+            stacks = []
+            key = [self.letter(w.tib_top(c)) for c in syl if w.tib_top(c) is not None]
+        if stacks:
+            w.markStacks(stacks, [])
+            r = 1 if stacks[0].prefix else 0
+            st = stacks[r]
+            letters = st.stack or ["a"]
+            sup = None
+            if len(letters) > 1 and w.superscript(letters[0], letters[1]):
+                sup = letters[0]
+                letters = letters[1:]
+            pre = stacks[0].single_cons if r else None
+            key.append(self.letter(letters[0]))
+            key.append((1 if pre else 0) + (2 if sup else 0))
+            key.append(self.letter(sup) if sup else 0)
+            key.append(self.letter(pre) if pre else 0)
+            key.extend(self.subscripts.get(x, LETTER + 0x3f) for x in letters[1:])
+            key.extend(self.signs(st))
+            for st in stacks[r + 1:]:
+                key.extend(self.letter(x) for x in st.stack or ["a"])
+                key.extend(self.signs(st))
+        key.append(0)
+        ret = bytes(bytearray(key))
+        if len(self.unicode_cache) >= MAX_CACHE:
+            self.unicode_cache.clear()
+        self.unicode_cache[syl] = ret
+        return ret
+
+    #  the key of one EWTS syllable (a segmentation key), through its Unicode
+    def wylieSyllableKey(self, syl):
+        ret = self.wylie_cache.get(syl)
+        if ret is not None:
+            return ret
+        ret = self.unicodeKey(self.wylie.fromWylie(syl, []))
+        if len(self.wylie_cache) >= MAX_CACHE:
+            self.wylie_cache.clear()
+        self.wylie_cache[syl] = ret
+        return ret
+
+    #  the sort key of Unicode text
+    def unicodeKey(self, str_):
+        return b"".join(self.syllableKey(key) for _, _, key in self.segmenter.segmentUnicode(str_))
+
+    #  the sort key of EWTS text
+    def wylieKey(self, str_):
+        return b"".join(self.wylieSyllableKey(key) for _, _, key in self.segmenter.segmentWylie(str_))
+
+    #  the sort key of text in either script: Unicode if it has any Tibetan character, else EWTS
+    def key(self, str_):
+        if TIBETAN.search(str_) is not None:
+            return self.unicodeKey(str_)
+        return self.wylieKey(str_)
+
+    #  the keys of many strings, in order; each distinct string is segmented once
+    def keys(self, strings):
+        done = {}
+        ret = []
+        for s in strings:
+            k = done.get(s)
+            if k is None:
+                k = done[s] = self.key(s)
+            ret.append(k)
+        return ret
+
+    #  'strings' in Tibetan alphabetical order (stable for strings with the same key)
+    def sort(self, strings):
+        strings = list(strings)
+        keys = self.keys(strings)
+        return [strings[n] for n in sorted(range(len(strings)), key=keys.__getitem__)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sort lines of Unicode or EWTS in Tibetan alphabetical order")
+    parser.add_argument("files", nargs="*", help="input files (default: standard input)")
+    args = parser.parse_args(argv)
+    lines = []
+    if args.files:
+        for path in args.files:
+            with io.open(path, encoding="utf-8") as f:
+                lines.extend(f.read().splitlines())
+    else:
+        lines = sys.stdin.read().splitlines()
+    for line in Collator().sort(lines):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from Wylie import sharedWylie
+#  Column-level conversion between Unicode Tibetan and Wylie (EWTS).
+#
+#  Catalog columns (titles, author names...) contain huge numbers of duplicates, so
+#  instead of converting row by row, every distinct value is converted once with a
+#  shared Wylie object and the results are scattered back to the rows.
+#
+#  Supported containers: list, tuple, NumPy object arrays, pandas Series and PyArrow
+#  string arrays (plain or chunked).  The result is returned in the same container type.
+#  None / NaN / null values are passed through unchanged.
+#
+#  Use:
+#      titles_wylie = convertColumn(df["title"], "toWylie")
+#      titles_uni = convertColumn(["sems can", "sems can", "thams cad"], "fromWylie")
+
+DIRECTIONS = ("fromWylie", "toWylie")
+
+
+#  convert a list of distinct, non-null strings with the given converter
+def _convertUnique(wylie, direction, values):
+    if direction == "fromWylie":
+        return [wylie.fromWylie(v) for v in values]
+    return [wylie.toWylie(v) for v in values]
+
+
+#  worker entry point for the process backend: each worker process uses its own shared
+#  converter, so only the strings travel between processes
+def _convertChunk(args):
+    direction, values = args
+    return _convertUnique(sharedWylie(), direction, values)
+
+
+#  null-like values which are passed through without conversion
+def _isNull(v):
+    return v is None or (isinstance(v, float) and v != v)
+
+
+#  convert the distinct values into a dict {value: converted value}
+def _convertDistinct(distinct, direction, wylie, workers, parallel_threshold, executor):
+    if workers and workers > 1 and len(distinct) >= parallel_threshold:
+        chunksize = max(1, (len(distinct) + workers * 4 - 1) // (workers * 4))
+        chunks = [distinct[k: k + chunksize] for k in range(0, len(distinct), chunksize)]
+        if executor == "thread":
+            with ThreadPoolExecutor(workers) as pool:
+                parts = pool.map(lambda c: _convertUnique(wylie, direction, c), chunks)
+                converted = [o for part in parts for o in part]
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                parts = pool.map(_convertChunk, [(direction, c) for c in chunks])
+                converted = [o for part in parts for o in part]
+    else:
+        converted = _convertUnique(wylie, direction, distinct)
+    return dict(zip(distinct, converted))
+
+
+#  deduplicate a plain sequence, keeping the first-seen order
+def _distinct(values):
+    seen = {}
+    for v in values:
+        if v not in seen and not _isNull(v):
+            seen[v] = None
+    return list(seen)
+
+
+#  Converts a whole column, converting each distinct value once.
+#
+#  Arguments are:
+#     values   : list, tuple, NumPy object array, pandas Series or PyArrow (chunked) string array
+#     direction: "toWylie" (Unicode -> Wylie) or "fromWylie" (Wylie -> Unicode)
+#     wylie    : the Wylie object to use; defaults to a shared one
+#     workers  : if > 1, distinct values are converted in parallel when there are at least
+#                parallel_threshold of them in the whole column
+#     executor : "process" (default) or "thread".  Process workers use their own default
+#                Wylie object, so a custom 'wylie' only applies to the thread backend.
+#
+#  Returns: the converted column, in the same container type as 'values'.
+def convertColumn(values, direction="toWylie", wylie=None, workers=None,  # noqa: C901
+                  parallel_threshold=10000, executor="process"):
+    if direction not in DIRECTIONS:
+        raise ValueError("direction must be one of " + ", ".join(DIRECTIONS) + ".")
+    if executor not in ("process", "thread"):
+        raise ValueError("executor must be \"process\" or \"thread\".")
+    if wylie is None:
+        wylie = sharedWylie()
+
+    def convert(distinct):
+        return _convertDistinct(distinct, direction, wylie, workers, parallel_threshold, executor)
+
+    # only look for container types whose library has already been imported by the caller:
+    # an object cannot be a pandas Series if pandas was never loaded
+    pd = sys.modules.get("pandas")
+    np = sys.modules.get("numpy")
+    pa = sys.modules.get("pyarrow")
+
+    # pandas: factorize is a C-level deduplication, nulls get the code -1
+    if pd is not None and isinstance(values, pd.Series):
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        distinct = [u for u in uniques]
+        table = convert(distinct)
+        # the extra last slot is picked by the null code -1, nulls are then put back as-is
+        lookup = np.empty(len(distinct) + 1, dtype=object)
+        lookup[:-1] = [table[u] for u in distinct]
+        out = lookup[codes]
+        nulls = codes == -1
+        out[nulls] = values.to_numpy(dtype=object)[nulls]
+        return pd.Series(out, index=values.index, name=values.name, dtype=object)
+
+    # pyarrow: dictionary-encode, convert the dictionary, take() it back.  A chunked array is
+    # deduplicated as a whole (values repeat across chunks), then every chunk is mapped onto
+    # the one converted dictionary; nulls match nothing in it and stay null.
+    if pa is not None and isinstance(values, pa.ChunkedArray):
+        import pyarrow.compute as pc
+        uniques = pc.unique(values).drop_null()
+        distinct = uniques.to_pylist()
+        table = convert(distinct)
+        dictionary = pa.array([table[u] for u in distinct], type=values.type)
+        return pa.chunked_array(
+            [pc.take(dictionary, pc.index_in(c, value_set=uniques)) for c in values.chunks],
+            type=values.type)
+    if pa is not None and isinstance(values, pa.Array):
+        import pyarrow.compute as pc
+        encoded = pc.dictionary_encode(values)
+        distinct = encoded.dictionary.to_pylist()
+        table = convert(distinct)
+        dictionary = pa.array([table[u] for u in distinct], type=values.type)
+        return pc.take(dictionary, encoded.indices)
+
+    # numpy object arrays
+    if np is not None and isinstance(values, np.ndarray):
+        flat = values.ravel().tolist()
+        table = convert(_distinct(flat))
+        out = np.empty(len(flat), dtype=object)
+        out[:] = [v if _isNull(v) else table[v] for v in flat]
+        return out.reshape(values.shape)
+
+    # plain python sequences
+    if isinstance(values, (list, tuple)):
+        table = convert(_distinct(values))
+        out = [v if _isNull(v) else table[v] for v in values]
+        return tuple(out) if isinstance(values, tuple) else out
+
+    raise TypeError("Unsupported column type: " + type(values).__name__ + ".")
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import ast
+import importlib
+import inspect
+import sys
+import textwrap
+from Wylie import Wylie
+#  Build step generating a specialized conversion engine from the reference Wylie class.
+#
+#  The hot loops of Wylie call tiny accessor methods (self.consonant(t), self.tib_top(c),
+#  self.isSuffix(s), ...) for every token or codepoint, each one a Python method call around
+#  a dict.get or a list scan.  This module takes the source of the hot methods, and rewrites:
+#    - table getters     self.consonant(t)        -> _w_consonant(t), bound to M_CONSONANT.get
+#    - membership tests  self.isSuffix(s)         -> s in _w_m_suffixes
+#    - pair tests        self.prefix(p, after)    -> after in _w_m_prefixes.get(p, ())
+#    - table attributes  self.m_tokens            -> M_TOKENS
+#    - state constants   self.State.PREFIX        -> 'PREFIX'
+#  and emits a module with the tables as literals (sets for membership) and a WylieFast
+#  subclass holding the rewritten methods.  Wylie stays the reference implementation:
+#  differential() checks that both produce identical output and warnings.
+#
+#  Build the module for deployment:  python WylieCompile.py WylieFast.py
+#  or get the class in-process with: WylieFast = loadFast()
+
+#  accessor method => table, for accessors which return table.get(arg)
+GETTERS = {
+    "consonant": "m_consonant",
+    "subjoined": "m_subjoined",
+    "vowel": "m_vowel",
+    "final_uni": "m_final_uni",
+    "final_class": "m_final_class",
+    "other": "m_other",
+    "ambiguous_key": "m_ambiguous_key",
+    "ambiguous_wylie": "m_ambiguous_wylie",
+    "tib_top": "m_tib_top",
+    "tib_subjoined": "m_tib_subjoined",
+    "tib_vowel": "m_tib_vowel",
+    "tib_vowel_long": "m_tib_vowel_long",
+    "tib_final_wylie": "m_tib_final_wylie",
+    "tib_final_class": "m_tib_final_class",
+    "tib_caret": "m_tib_caret",
+    "tib_other": "m_tib_other",
+}
+
+#  accessor method => table, for accessors which return (arg in table)
+MEMBERS = {
+    "isSpecial": "m_special",
+    "isSuperscript": "m_superscripts",
+    "isSubscript": "m_subscripts",
+    "isPrefix": "m_prefixes",
+    "isSuffix": "m_suffixes",
+    "isSuff2": "m_suff2",
+    "tib_stack": "m_tib_stacks",
+}
+
+#  accessor method => table, for accessors which return (arg2 in table.get(arg1))
+PAIRS = {
+    "superscript": "m_superscripts",
+    "subscript": "m_subscripts",
+    "prefix": "m_prefixes",
+    "suff2": "m_suff2",
+}
+
+#  the methods which get specialized
+HOT_METHODS = (
+    "splitIntoTokens", "fromWylie", "fromWylieOneTsekbar", "fromWylieOneStack",
+    "consonantString", "consonantStringBackwards", "handleSpaces", "toWylieOptions",
+    "followedByNonTibetan", "toWylieOneTsekbar", "markStacks", "toWylieOneStack", "putStackTogether",
+)
+
+
+def constName(table):
+    return table.upper()
+
+
+#  the source of a table as a literal; lists (only ever used for membership) become sets
+def literal(v):
+    if isinstance(v, dict):
+        return "{" + ", ".join(repr(k) + ": " + literal(v[k]) for k in sorted(v, key=repr)) + "}"
+    if isinstance(v, (list, tuple, set, frozenset)):
+        if not v:
+            return "frozenset()"
+        return "frozenset({" + ", ".join(repr(x) for x in sorted(set(v))) + "})"
+    return repr(v)
+
+
+class Specializer(ast.NodeTransformer):
+
+    def __init__(self):
+        #  local name => expression it is bound to in the function prologue
+        self.bound = {}
+        #  all names read by the function (to import the globals it uses)
+        self.names = set()
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.names.add(node.id)
+        return node
+
+    def bind(self, local, expr):
+        self.bound[local] = expr
+        return ast.Name(id=local, ctx=ast.Load())
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        f = node.func
+        if not (isinstance(f, ast.Attribute) and isinstance(f.value, ast.Name) and f.value.id == "self"):
+            return node
+        if f.attr in GETTERS and len(node.args) == 1:
+            local = self.bind("_w_" + f.attr, constName(GETTERS[f.attr]) + ".get")
+            return ast.copy_location(ast.Call(func=local, args=node.args, keywords=[]), node)
+        if f.attr in MEMBERS and len(node.args) == 1:
+            table = MEMBERS[f.attr]
+            local = self.bind("_w_" + table, constName(table))
+            return ast.copy_location(ast.Compare(left=node.args[0], ops=[ast.In()], comparators=[local]), node)
+        if f.attr in PAIRS and len(node.args) == 2:
+            table = PAIRS[f.attr]
+            local = self.bind("_w_" + table, constName(table))
+            lookup = ast.Call(func=ast.Attribute(value=local, attr="get", ctx=ast.Load()),
+                              args=[node.args[0], ast.Tuple(elts=[], ctx=ast.Load())], keywords=[])
+            return ast.copy_location(ast.Compare(left=node.args[1], ops=[ast.In()], comparators=[lookup]), node)
+        return node
+
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        v = node.value
+        if isinstance(v, ast.Name) and v.id == "self" and node.attr in Wylie.TABLES and \
+                isinstance(node.ctx, ast.Load):
+            return ast.copy_location(ast.Name(id=constName(node.attr), ctx=ast.Load()), node)
+        if isinstance(v, ast.Attribute) and v.attr == "State" and isinstance(v.value, ast.Name) and \
+                v.value.id == "self":
+            return ast.copy_location(ast.Constant(value=getattr(Wylie.State, node.attr)), node)
+        return node
+
+
+#  rewrite one method of 'cls'; returns its source, indented for a class body, and the
+#  names of the globals of the reference module which it uses
+def specializeMethod(cls, name):
+    # parsed inside a class body rather than dedented: dedenting would also change the
+    # indentation inside backslash-continued string literals
+    tree = ast.parse("class _Method:\n" + inspect.getsource(getattr(cls, name)))
+    tree = ast.Module(body=tree.body[0].body, type_ignores=[])
+    func = tree.body[0]
+    spec = Specializer()
+    spec.visit(func)
+    prologue = [ast.parse(local + " = " + expr).body[0] for local, expr in sorted(spec.bound.items())]
+    func.body = prologue + func.body
+    func.decorator_list = []
+    ast.fix_missing_locations(tree)
+    module = sys.modules[cls.__module__].__dict__
+    used = set(n for n in spec.names if n in module and n != cls.__name__)
+    return textwrap.indent(ast.unparse(tree), "    "), used
+
+
+#  the full source of the specialized engine module
+def generateSource(cls=Wylie):
+    cls.loadHashes()
+    methods = []
+    used = set([cls.__name__])
+    for name in HOT_METHODS:
+        src, names = specializeMethod(cls, name)
+        methods += ["", src]
+        used |= names
+    lines = [
+        "# -*- coding: utf-8 -*-",
+        "# Generated by WylieCompile.py from " + cls.__name__ + " -- do not edit.",
+        "from " + cls.__module__ + " import " + ", ".join(sorted(used)),
+        "",
+        "FINGERPRINT = " + repr(cls.tablesFingerprint()),
+        "",
+    ]
+    for table in cls.TABLES:
+        lines.append(constName(table) + " = " + literal(getattr(cls, table)))
+    lines += ["", "", "class WylieFast(" + cls.__name__ + "):"] + methods
+    return "\n".join(lines) + "\n"
+
+
+#  write the generated module to 'path'
+def build(path="WylieFast.py", cls=Wylie):
+    with open(path, "w") as f:
+        f.write(generateSource(cls))
+
+
+#  Returns the WylieFast class: from an up-to-date generated WylieFast module if one is
+#  importable, otherwise generated and compiled in memory.
+def loadFast(cls=Wylie):
+    fingerprint = cls.tablesFingerprint()
+    try:
+        mod = importlib.import_module("WylieFast")
+        if mod.FINGERPRINT == fingerprint:
+            return mod.WylieFast
+    except ImportError:
+        pass
+    ns = {}
+    exec(compile(generateSource(cls), "<WylieFast>", "exec"), ns)
+    return ns["WylieFast"]
+
+
+#  Differential check: converts every text with both engines in both directions, and returns
+#  the list of (direction, text, reference result, fast result) which differ.  An exception
+#  is a result too (its type name), so both engines must raise on the same inputs.
+def differential(texts, fast=None, ref=None):
+    fast = fast if fast is not None else loadFast()()
+    ref = ref if ref is not None else Wylie()
+    diffs = []
+    for text in texts:
+        for direction in ("fromWylie", "toWylie"):
+            results = []
+            for engine in (ref, fast):
+                warns = []
+                try:
+                    if direction == "fromWylie":
+                        out = engine.fromWylie(text, warns)
+                    else:
+                        out = engine.toWylieOptions(text, warns, True)
+                except Exception as e:
+                    out = type(e).__name__
+                results.append((out, warns))
+            if results[0] != results[1]:
+                diffs.append((direction, text, results[0], results[1]))
+    return diffs
+
+
+if __name__ == "__main__":
+    build(sys.argv[1] if len(sys.argv) > 1 else "WylieFast.py")
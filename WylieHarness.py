@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import json
+import random
+import signal
+import sys
+import time
+from Wylie import Wylie
+from WylieReference import WylieReference
+#  Differential performance-regression harness.
+#
+#  Generates large randomized EWTS and Unicode inputs from the conversion tables (regular
+#  syllables with prefixes/superscripts/subscripts/suffixes, Sanskrit stacks with "+" and "^",
+#  finals, [comments] and escapes, stray tokens...), converts each of them with the frozen
+#  reference engine (WylieReference.py) and with a candidate engine, and compares output and
+#  warnings.  The speed ratio of the candidate is measured in the same run.
+#
+#  Run:  python WylieHarness.py --count 5000 --seed 1 [--candidate fast] [--json report.json]
+#  The exit status is 1 if any input converts differently.
+
+#  per-input time limit for each engine, in seconds (where SIGALRM is available)
+TIMEOUT = 10
+
+
+class InputTimeout(BaseException):
+    pass
+
+
+def _alarm(signum, frame):
+    raise InputTimeout()
+
+
+class InputGenerator(object):
+
+    FINALS = ("M", "~M`", "~M", "X", "~X", "H", "?")
+    VOWELS = ("a", "a", "a", "i", "u", "e", "o", "A", "I", "U", "ai", "au", "-i", "-I")
+    SEPARATORS = (" ", " ", " ", " ", "  ", "    ", "/", "_", "//", ";", "|", ":", "*", "!")
+    ENGLISH = ("the", "text", "is", "commentary", "on", "a", "verse", "of", "page", "12")
+
+    def __init__(self, seed=1, wylie=None):
+        self.rng = random.Random(seed)
+        w = wylie if wylie is not None else WylieReference()
+        self.consonants = sorted(k for k in w.m_consonant if k != "a")
+        self.subjoinable = sorted(w.m_subjoined)
+        self.prefixes = dict((k, sorted(v)) for k, v in w.m_prefixes.items())
+        self.superscripts = dict((k, sorted(v)) for k, v in w.m_superscripts.items())
+        self.subscripts = dict((k, sorted(v)) for k, v in w.m_subscripts.items())
+        self.suffixes = sorted(w.m_suffixes)
+        self.suff2 = dict((k, sorted(v)) for k, v in w.m_suff2.items())
+        self.stacks = sorted(w.m_tib_stacks)
+        self.others = sorted(k for k in w.m_other if k not in (" ",))
+        self.tokens = sorted(set(self.consonants) | set(w.m_vowel) | set(w.m_final_uni) |
+                             set(w.m_special) - set(["]"]) | set(w.m_tokens) - set(["\r\n"]))
+        self.tib_signs = sorted(set(w.m_tib_top) | set(w.m_tib_subjoined) | set(w.m_tib_vowel) |
+                                set(w.m_tib_final_wylie) | set(w.m_tib_other) - set([" "]))
+        self.reference = w
+
+    def choice(self, seq):
+        return self.rng.choice(seq)
+
+    #  a main stack, as a list of consonants
+    def root(self):
+        r = self.rng.random()
+        if r < 0.4:
+            return [self.choice(self.consonants)]
+        if r < 0.6:
+            sup = self.choice(sorted(self.superscripts))
+            return [sup] + self.choice(self.superscripts[sup]).split("+")
+        if r < 0.8:
+            sub = self.choice(sorted(self.subscripts))
+            return self.choice(self.subscripts[sub]).split("+") + [sub]
+        return self.choice(self.stacks).split("+")
+
+    #  a regular (Tibetan) syllable
+    def syllable(self):
+        out = ""
+        if self.rng.random() < 0.3:
+            pre = self.choice(sorted(self.prefixes))
+            out += pre
+            stack = self.choice(self.prefixes[pre]).split("+")
+            if self.rng.random() < 0.3:
+                out += "."
+        else:
+            stack = self.root()
+        out += "".join(stack) + self.choice(self.VOWELS)
+        if self.rng.random() < 0.5:
+            suff = self.choice(self.suffixes)
+            out += suff
+            for s2, before in sorted(self.suff2.items()):
+                if suff in before and self.rng.random() < 0.3:
+                    out += s2
+                    break
+        if self.rng.random() < 0.05:
+            out += self.choice(self.FINALS)
+        return out
+
+    #  a Sanskrit stack with explicit "+", carets and finals
+    def sanskrit(self):
+        cons = [self.choice(self.consonants)] + \
+            [self.choice(self.subjoinable) for _ in range(self.rng.randint(1, 3))]
+        out = "+".join(cons)
+        if self.rng.random() < 0.2:
+            out += "^"
+        out += self.choice(self.VOWELS)
+        for _ in range(self.rng.randint(0, 2)):
+            out += self.choice(self.FINALS)
+        return out
+
+    #  a random sequence of tokens (mostly invalid syllables)
+    def soup(self):
+        return "".join(self.choice(self.tokens) for _ in range(self.rng.randint(1, 6)))
+
+    def comment(self, depth=0):
+        words = []
+        for _ in range(self.rng.randint(1, 6)):
+            r = self.rng.random()
+            if r < 0.1 and depth < 2:
+                words.append(self.comment(depth + 1))
+            elif r < 0.2:
+                words.append(self.choice(("\\[", "\\]", "\\u0f40", "\\x", "\\UFFFFFFFF", "\\uD800")))
+            else:
+                words.append(self.choice(self.ENGLISH))
+        return "[" + " ".join(words) + "]"
+
+    #  an escape; some out of the Unicode range or lone surrogates, which must be rejected
+    def escape(self):
+        return self.choice(("\\u0f40", "\\u0f0b", "\\u0f7f", "\\x", "\\/", "\\U00000f40",
+                            "\\UFFFFFFFF", "\\U00110000", "\\uD800", "\\udfff"))
+
+    #  Wylie text with about n pieces
+    def wylieText(self, n):
+        out = []
+        for k in range(n):
+            r = self.rng.random()
+            if r < 0.6:
+                out.append(self.syllable())
+            elif r < 0.72:
+                out.append(self.sanskrit())
+            elif r < 0.82:
+                out.append(self.soup())
+            elif r < 0.87:
+                out.append(self.comment())
+            elif r < 0.91:
+                out.append(self.escape())
+            else:
+                out.append(self.choice(self.others))
+            if k < n - 1:
+                if self.rng.random() < 0.03:
+                    out.append(self.choice(("\n", "\n", "\n ", "\n   ", " \n")))
+                else:
+                    out.append(self.choice(self.SEPARATORS))
+        return "".join(out)
+
+    #  Unicode text with about n pieces: converted syllables, random Tibetan signs (in any
+    #  order), non-Tibetan words, spaces and newlines
+    def unicodeText(self, n):
+        out = []
+        ref = self.reference
+        for _ in range(n):
+            r = self.rng.random()
+            if r < 0.6:
+                out.append(ref.fromWylie(self.choice((self.syllable, self.sanskrit))()))
+            elif r < 0.8:
+                out.append("".join(self.choice(self.tib_signs) for _ in range(self.rng.randint(1, 5))))
+            elif r < 0.9:
+                out.append(self.choice(self.ENGLISH) + self.choice(("", "[", "]", u"\u0f00", u"\u0f76")))
+            else:
+                out.append(self.choice(("\n", "\r\n", u"\u200b", u"\ufeff")))
+            out.append(self.choice((u"\u0f0b", u"\u0f0b", " ", "  ", u"\u0f0d ", "")))
+        return "".join(out)
+
+
+#  run one conversion; returns (output, warnings), or the name of the exception raised (output
+#  which cannot be encoded in UTF-8, e.g. with a lone surrogate, is a UnicodeEncodeError)
+def runOne(engine, direction, text):
+    warns = []
+    try:
+        if direction == "fromWylie":
+            out = engine.fromWylie(text, warns)
+        else:
+            out = engine.toWylieOptions(text, warns, True)
+        out.encode("utf-8")
+    except InputTimeout:
+        return ("TIMEOUT",)
+    except Exception as e:
+        return ("EXCEPTION", type(e).__name__)
+    return (out, warns)
+
+
+#  Did a conversion time out, or give output which is not valid Unicode?  Those are failures
+#  even if both engines agree.  (Other exceptions are compared like outputs: the reference
+#  raises on some malformed stacks.)
+def failed(result):
+    return result in (("TIMEOUT",), ("EXCEPTION", "UnicodeEncodeError"))
+
+
+#  time one conversion, with the per-input time limit
+def timedRun(engine, direction, text):
+    use_alarm = hasattr(signal, "SIGALRM")
+    if use_alarm:
+        old = signal.signal(signal.SIGALRM, _alarm)
+        signal.alarm(TIMEOUT)
+    try:
+        t = time.perf_counter()
+        result = runOne(engine, direction, text)
+        return result, time.perf_counter() - t
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old)
+
+
+#  Compares 'candidate' with the reference engine on 'count' random inputs of each direction.
+#  Returns the report (a dict); report["divergences"] lists the inputs which differ.
+def runHarness(candidate=None, count=1000, seed=1, pieces=40, max_divergences=50):
+    candidate = candidate if candidate is not None else Wylie()
+    reference = WylieReference()
+    gen = InputGenerator(seed, reference)
+    report = {"seed": seed, "count": count, "directions": {}, "divergences": []}
+    total_divergences = 0
+    for direction in ("fromWylie", "toWylie"):
+        ref_time = cand_time = 0.0
+        chars = 0
+        diverged = 0
+        for k in range(count):
+            text = gen.wylieText(pieces) if direction == "fromWylie" else gen.unicodeText(pieces)
+            chars += len(text)
+            # alternate the order, so that cache effects do not favour one engine
+            if k % 2:
+                expected, rt = timedRun(reference, direction, text)
+                got, ct = timedRun(candidate, direction, text)
+            else:
+                got, ct = timedRun(candidate, direction, text)
+                expected, rt = timedRun(reference, direction, text)
+            ref_time += rt
+            cand_time += ct
+            if got != expected or failed(got):
+                diverged += 1
+                if len(report["divergences"]) < max_divergences:
+                    report["divergences"].append({"direction": direction, "input": text,
+                                                  "reference": expected, "candidate": got})
+        total_divergences += diverged
+        report["directions"][direction] = {
+            "inputs": count,
+            "chars": chars,
+            "divergences": diverged,
+            "reference_s": ref_time,
+            "candidate_s": cand_time,
+            "speedup": ref_time / cand_time if cand_time > 0 else 0.0,
+        }
+    report["total_divergences"] = total_divergences
+    report["ok"] = total_divergences == 0
+    return report
+
+
+def printReport(report, out=sys.stdout):
+    print("differential harness: seed %d, %d inputs per direction" % (report["seed"], report["count"]), file=out)
+    for direction, d in sorted(report["directions"].items()):
+        print("  %-9s: %6d chars/input avg, reference %8.3f s, candidate %8.3f s, x%.2f, %d divergences" %
+              (direction, d["chars"] // max(1, d["inputs"]), d["reference_s"], d["candidate_s"],
+               d["speedup"], d["divergences"]), file=out)
+    for div in report["divergences"][:5]:
+        print("  DIVERGENCE (%s) on %r:\n    reference: %r\n    candidate: %r" %
+              (div["direction"], div["input"], div["reference"], div["candidate"]), file=out)
+    print("  %s" % ("OK" if report["ok"] else "FAILED: %d divergences" % report["total_divergences"]), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Differential harness against the frozen reference engine")
+    parser.add_argument("--count", type=int, default=1000, help="inputs per direction")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--pieces", type=int, default=40, help="syllables/pieces per input")
+    parser.add_argument("--candidate", choices=("wylie", "fast"), default="wylie",
+                        help="engine to check: Wylie, or the specialized engine of WylieCompile.py")
+    parser.add_argument("--json", help="also write the full report to this file")
+    args = parser.parse_args(argv)
+    if args.candidate == "fast":
+        from WylieCompile import loadFast
+        candidate = loadFast()()
+    else:
+        candidate = Wylie()
+    report = runHarness(candidate, args.count, args.seed, args.pieces)
+    printReport(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1, sort_keys=True)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
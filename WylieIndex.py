@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import io
+import json
+import struct
+import sys
+from array import array
+from Wylie import sharedWylie
+from WylieSegment import Segmenter, normalizeUnicode
+#  Transliteration-agnostic inverted index over mixed Unicode / EWTS corpora.
+#
+#  Every tsekbar of every document, in either script, is mapped to one canonical syllable ID:
+#  the ID of its Unicode form.  Unicode syllables are only normalized; EWTS syllables are
+#  converted with fromWylie(), once per distinct syllable.  Documents themselves are never
+#  converted, and offsets always point into the original text.
+#
+#  File format (little-endian):
+#      magic "WYLI\x01", 4 x uint32: number of documents, number of syllables,
+#      length of the JSON header, length of the postings
+#      JSON header: {"docs": [name, ...], "syllables": [unicode syllable, ...]}  (ID = position)
+#      uint64 x (syllables + 1): offset of the postings of each syllable in the postings
+#      postings: per syllable, varint-encoded and delta-encoded groups of
+#          doc delta, number of occurrences n, then n x (position delta, start delta, length)
+#      where position is the index of the syllable in the document (for phrase queries) and
+#      start, length its span in the original text.
+#
+#  Use:
+#      builder = IndexBuilder()
+#      builder.add("doc1.txt", text)
+#      builder.write("corpus.idx")
+#      index = SyllableIndex("corpus.idx")
+#      index.search("sangs rgyas")   # or u"སངས་རྒྱས" => [(doc name, start, end), ...]
+
+MAGIC = b"WYLI\x01"
+HEADER = struct.Struct("<4I")
+
+
+def encodeVarints(values, out):
+    for v in values:
+        while v >= 0x80:
+            out.append((v & 0x7f) | 0x80)
+            v >>= 7
+        out.append(v)
+
+
+def decodeVarints(data, start, end):
+    values = []
+    v = shift = 0
+    for b in data[start:end]:
+        v |= (b & 0x7f) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            values.append(v)
+            v = shift = 0
+    return values
+
+
+#  Maps the keys of segmented syllables, in either script, to their canonical (Unicode) form;
+#  EWTS syllables are converted once each.
+class Canonicalizer(object):
+
+    def __init__(self, wylie=None):
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        self.cache = {}
+
+    def canonical(self, key, unicode):
+        if unicode:
+            return key
+        uni = self.cache.get(key)
+        if uni is None:
+            uni = normalizeUnicode(self.wylie.fromWylie(key, []))
+            self.cache[key] = uni
+        return uni
+
+
+class IndexBuilder(object):
+
+    def __init__(self, wylie=None):
+        wylie = wylie if wylie is not None else sharedWylie()
+        self.segmenter = Segmenter(wylie)
+        self.canonicalizer = Canonicalizer(wylie)
+        self.docs = []
+        self.ids = {}
+        # syllable ID => array of (doc, position, start, end) quadruples
+        self.postings = []
+
+    #  index one document; returns its number
+    def add(self, name, text):
+        doc = len(self.docs)
+        self.docs.append(name)
+        unicode = self.segmenter.isUnicode(text)
+        spans = self.segmenter.segmentUnicode(text) if unicode else self.segmenter.segmentWylie(text)
+        canonical = self.canonicalizer.canonical
+        ids = self.ids
+        postings = self.postings
+        for pos, (start, end, key) in enumerate(spans):
+            syl = canonical(key, unicode)
+            sid = ids.get(syl)
+            if sid is None:
+                sid = ids[syl] = len(postings)
+                postings.append(array("L"))
+            postings[sid].extend((doc, pos, start, end))
+        return doc
+
+    def addFile(self, path, encoding="utf-8"):
+        with io.open(path, encoding=encoding) as f:
+            return self.add(path, f.read())
+
+    #  the delta-encoded postings of one syllable
+    def encodePostings(self, quads, out):
+        values = []
+        prev_doc = 0
+        k = 0
+        n = len(quads)
+        while k < n:
+            doc = quads[k]
+            group_end = k
+            while group_end < n and quads[group_end] == doc:
+                group_end += 4
+            values.append(doc - prev_doc)
+            values.append((group_end - k) // 4)
+            prev_pos = prev_start = 0
+            while k < group_end:
+                pos, start, end = quads[k + 1], quads[k + 2], quads[k + 3]
+                values.append(pos - prev_pos)
+                values.append(start - prev_start)
+                values.append(end - start)
+                prev_pos, prev_start = pos, start
+                k += 4
+            prev_doc = doc
+        encodeVarints(values, out)
+
+    def write(self, path):
+        syllables = sorted(self.ids, key=self.ids.get)
+        blob = bytearray()
+        offsets = array("Q", [0])
+        for quads in self.postings:
+            self.encodePostings(quads, blob)
+            offsets.append(len(blob))
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        header = json.dumps({"docs": self.docs, "syllables": syllables}, ensure_ascii=False).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(len(self.docs), len(syllables), len(header), len(blob)))
+            f.write(header)
+            f.write(offsets.tobytes())
+            f.write(blob)
+
+
+class SyllableIndex(object):
+
+    def __init__(self, path, wylie=None):
+        wylie = wylie if wylie is not None else sharedWylie()
+        self.segmenter = Segmenter(wylie)
+        self.canonicalizer = Canonicalizer(wylie)
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a syllable index file: " + path)
+        pos = len(MAGIC)
+        n_docs, n_syllables, header_len, blob_len = HEADER.unpack_from(data, pos)
+        pos += HEADER.size
+        header = json.loads(data[pos: pos + header_len].decode("utf-8"))
+        pos += header_len
+        self.docs = header["docs"]
+        self.ids = dict((s, k) for k, s in enumerate(header["syllables"]))
+        self.offsets = array("Q")
+        self.offsets.frombytes(data[pos: pos + 8 * (n_syllables + 1)])
+        if sys.byteorder != "little":
+            self.offsets.byteswap()
+        pos += 8 * (n_syllables + 1)
+        self.blob = memoryview(data)[pos: pos + blob_len]
+
+    #  IDs of the syllables of a query in either script, or None if one is not in the index
+    def syllableIds(self, query):
+        unicode = self.segmenter.isUnicode(query)
+        spans = self.segmenter.segmentUnicode(query) if unicode else self.segmenter.segmentWylie(query)
+        ids = []
+        for _, _, key in spans:
+            sid = self.ids.get(self.canonicalizer.canonical(key, unicode))
+            if sid is None:
+                return None
+            ids.append(sid)
+        return ids
+
+    #  decoded postings of a syllable: {doc: [(position, start, end), ...]}
+    def postings(self, sid):
+        values = decodeVarints(self.blob, self.offsets[sid], self.offsets[sid + 1])
+        ret = {}
+        doc = 0
+        k = 0
+        while k < len(values):
+            doc += values[k]
+            n = values[k + 1]
+            k += 2
+            occ = []
+            pos = start = 0
+            for _ in range(n):
+                pos += values[k]
+                start += values[k + 1]
+                occ.append((pos, start, start + values[k + 2]))
+                k += 3
+            ret[doc] = occ
+        return ret
+
+    #  Phrase query, in Unicode or EWTS: returns [(doc name, start, end), ...] for every run of
+    #  consecutive syllables matching the query, in document order.
+    def search(self, query):
+        ids = self.syllableIds(query)
+        if not ids:
+            return []
+        # documents having all the syllables, intersecting the smallest posting lists first
+        lists = [self.postings(sid) for sid in ids]
+        docs = set(lists[0])
+        for p in sorted(lists[1:], key=len):
+            docs &= set(p)
+            if not docs:
+                return []
+        hits = []
+        for doc in sorted(docs):
+            following = [dict((pos, (start, end)) for pos, start, end in p[doc]) for p in lists[1:]]
+            for pos, start, end in lists[0][doc]:
+                last_end = end
+                for k, occ in enumerate(following):
+                    span = occ.get(pos + k + 1)
+                    if span is None:
+                        break
+                    last_end = span[1]
+                else:
+                    hits.append((self.docs[doc], start, last_end))
+        return hits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Syllable index over Unicode and EWTS documents")
+    sub = parser.add_subparsers(dest="command")
+    b = sub.add_parser("build", help="index files")
+    b.add_argument("index")
+    b.add_argument("files", nargs="+")
+    s = sub.add_parser("search", help="phrase query, in Unicode or EWTS")
+    s.add_argument("index")
+    s.add_argument("query")
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        builder = IndexBuilder()
+        for path in args.files:
+            builder.addFile(path)
+        builder.write(args.index)
+    elif args.command == "search":
+        for name, start, end in SyllableIndex(args.index).search(args.query):
+            print("%s:%d-%d" % (name, start, end))
+    else:
+        parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
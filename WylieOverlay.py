@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+from itertools import chain
+from Wylie import Wylie
+#  Copy-on-write table overlays: variant converters defined as the standard tables plus a
+#  small delta.
+#
+#  variant(delta) returns a subclass of Wylie whose changed tables are overlays holding only
+#  the delta entries, and falling through to the (shared, never modified) tables of the base
+#  class for everything else.  Tables which the delta does not touch are not copied at all:
+#  the variant simply inherits them.  The tokenizer tables (m_tokens, m_tokens_start) are
+#  extended only with the new multi-character tokens of the delta, so a variant costs a class
+#  object and a few small dicts, and any number of them can coexist in one process.
+#
+#  The delta maps table names (see Wylie.TABLES) to:
+#    - for dict tables: a dict of entries added to, or replacing, the base entries
+#    - for list tables (m_special, m_suffixes, m_tib_stacks): an iterable of extra items
+#  As in initHashes(), both directions are separate tables: a new punctuation mark needs an
+#  m_other entry for fromWylie() and an m_tib_other entry for toWylie().
+#
+#  Variants are cached by delta, so asking again for the same delta returns the same class.
+#  They are runtime classes: WylieCompile cannot generate a specialized engine from them, and
+#  they do not read or write the serialized tables file.
+#
+#  Use:
+#      Tenant = variant({"m_tib_stacks": ["k+m"],
+#                        "m_other": {"||": u"༎"}, "m_tib_other": {u"༎": "||"}})
+#      Tenant().fromWylie("k+ma ||")      # => u"ཀྨ་༎": "||" is one token
+#      Tenant().toWylie(u"ཀྨ་༎")          # => "kma ||": "k+m" is a known stack
+
+#  tables derived from the others, which a delta may not change directly
+DERIVED = ("m_tokens", "m_tokens_start")
+
+#  tables whose keys are tokens of the fromWylie() tokenizer
+TOKEN_TABLES = ("m_consonant", "m_subjoined", "m_vowel", "m_final_uni", "m_final_class", "m_other",
+                "m_tib_vowel_long", "m_tib_caret", "m_suffixes")
+
+
+#  A dict table seen as the base table plus overriding entries.  Only the methods the
+#  converter and the other modules use are provided: get, [], in, iteration, len and items.
+class DictOverlay(object):
+    __slots__ = ("base", "delta")
+
+    def __init__(self, base, delta):
+        self.base = base
+        self.delta = delta
+
+    def get(self, key, default=None):
+        delta = self.delta
+        if key in delta:
+            return delta[key]
+        return self.base.get(key, default)
+
+    def __getitem__(self, key):
+        delta = self.delta
+        if key in delta:
+            return delta[key]
+        return self.base[key]
+
+    def __contains__(self, key):
+        return key in self.delta or key in self.base
+
+    def __iter__(self):
+        delta = self.delta
+        return chain(delta, (k for k in self.base if k not in delta))
+
+    def __len__(self):
+        return len(self.delta) + sum(1 for k in self.base if k not in self.delta)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[k] for k in self]
+
+    def items(self):
+        return [(k, self[k]) for k in self]
+
+
+#  A list table (only ever used for membership and iteration) plus extra items.
+class ListOverlay(object):
+    __slots__ = ("base", "extra")
+
+    def __init__(self, base, extra):
+        self.base = base
+        self.extra = frozenset(x for x in extra if x not in base)
+
+    def __contains__(self, item):
+        return item in self.extra or item in self.base
+
+    def __iter__(self):
+        return chain(self.base, sorted(self.extra))
+
+    def __len__(self):
+        return len(self.base) + len(self.extra)
+
+
+#  overlay 'changes' on the table 'name' of 'base'
+def overlayTable(base, name, changes):
+    table = getattr(base, name)
+    if isinstance(table, dict) or isinstance(table, DictOverlay):
+        return DictOverlay(table, dict(changes))
+    if isinstance(changes, (str, bytes)):
+        raise ValueError("Items of list table %s must be given as a list." % name)
+    return ListOverlay(table, changes)
+
+
+#  the overlays of m_tokens and m_tokens_start for the new tokens of 'delta', or {} if there
+#  are none
+def tokenOverlays(base, delta):
+    new = set()
+    for name in TOKEN_TABLES:
+        for token in delta.get(name, ()):
+            if len(token) > 1 and token not in base.m_tokens:
+                new.add(token)
+    if not new:
+        return {}
+    start = {}
+    for token in new:
+        c = token[0]
+        start[c] = max(start.get(c, base.m_tokens_start.get(c, 0)), len(token))
+    return {"m_tokens": ListOverlay(base.m_tokens, new),
+            "m_tokens_start": DictOverlay(base.m_tokens_start, start)}
+
+
+#  hashable form of a delta, for the variant cache
+def deltaKey(delta):
+    key = []
+    for name in sorted(delta):
+        changes = delta[name]
+        if isinstance(changes, dict):
+            key.append((name, repr(sorted(changes.items()))))
+        else:
+            key.append((name, repr(sorted(changes))))
+    return tuple(key)
+
+
+_variants = {}
+
+
+#  The variant of 'base' (Wylie or a subclass, or another variant) with the tables changed by
+#  'delta'.  Raises ValueError for unknown or derived tables.
+def variant(delta, base=Wylie, name=None):
+    key = (base, deltaKey(delta), name)
+    cls = _variants.get(key)
+    if cls is not None:
+        return cls
+    base.loadHashes()
+    attrs = {"_tables_ready": True}
+    for table, changes in delta.items():
+        if table not in base.TABLES:
+            raise ValueError("Unknown table: %s" % table)
+        if table in DERIVED:
+            raise ValueError("%s is derived from the other tables and cannot be changed." % table)
+        attrs[table] = overlayTable(base, table, changes)
+    attrs.update(tokenOverlays(base, delta))
+    cls = _variants[key] = type(name or base.__name__ + "Variant", (base,), attrs)
+    return cls
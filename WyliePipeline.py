@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import collections
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from Wylie import ConversionStats, sharedWylie
+#  Ordered, back-pressured line conversion for large jobs.
+#
+#  Lines are converted in batches by a pool of workers, with at most 'window' batches in
+#  flight, so memory stays bounded whatever the size of the input.  Converted lines come out
+#  in input order, each with its warnings, which carry the original line numbers.
+#
+#  Use:
+#      pipe = WyliePipeline("fromWylie", workers=8)
+#      with open("in.txt") as f, open("out.txt", "w") as out:
+#          for lineno, text, warns in pipe.run(f):
+#              out.write(text)
+#      print(pipe.progress())
+#
+#  With stats=True the workers also count syllables (see Wylie.ConversionStats), and their
+#  counters are merged into pipe.stats as the batches come back.
+#
+#  Every line is converted as fromWylie() / toWylieOptions() would convert it on its own, blank
+#  lines included (which get a "No Tibetan characters found!" warning).  With skip_blank=True,
+#  lines holding only whitespace are passed through unchanged and without warnings instead.
+
+
+#  convert one batch of lines: returns ([(converted line, warnings), ...], statistics or None)
+def _convertBatch(wylie, direction, escape, first_line, lines, count=False, skip_blank=False):
+    ret = []
+    stats = ConversionStats() if count else None
+    line = first_line
+    for s in lines:
+        ws = []
+        if skip_blank and not s.strip():
+            ret.append((s, ws))
+        elif direction == "fromWylie":
+            ret.append((wylie.fromWylie(s, ws, line, stats=stats), ws))
+        else:
+            ret.append((wylie.toWylieOptions(s, ws, escape, line, stats=stats), ws))
+        line += 1
+    return ret, stats
+
+
+#  worker entry point for the process backend, using the worker's own shared Wylie object
+def _convertBatchShared(args):
+    return _convertBatch(sharedWylie(), *args)
+
+
+class WyliePipeline(object):
+
+    #  Arguments are:
+    #     direction: "fromWylie" or "toWylie"
+    #     workers  : number of worker threads/processes; 0 or None converts in the calling thread
+    #     executor : "process" (default, uses all cores) or "thread".  Process workers use their
+    #                own Wylie object with the default options, so 'wylie' only applies to the
+    #                thread and in-thread modes.
+    #     window   : maximum number of batches in flight (default: 4 per worker)
+    #     batch    : number of lines per batch
+    #     escape   : for toWylie, see Wylie.toWylieOptions()
+    #     stats    : collect syllable statistics in self.stats (a Wylie.ConversionStats)
+    #     skip_blank: pass lines holding only whitespace through unchanged, without converting
+    #                them (so without their "No Tibetan characters found!" warning)
+    def __init__(self, direction="fromWylie", workers=None, executor="process", window=None,
+                 batch=256, escape=True, wylie=None, stats=False, skip_blank=False):
+        if direction not in ("fromWylie", "toWylie"):
+            raise ValueError("direction must be \"fromWylie\" or \"toWylie\".")
+        if executor not in ("process", "thread"):
+            raise ValueError("executor must be \"process\" or \"thread\".")
+        self.direction = direction
+        self.workers = workers or 0
+        self.executor = executor
+        self.window = window or max(1, self.workers) * 4
+        self.batch = batch
+        self.escape = escape
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        self.count = stats
+        self.skip_blank = skip_blank
+        self.resetCounters()
+
+    def resetCounters(self):
+        self.lines_in = 0
+        self.lines_out = 0
+        self.chars_in = 0
+        self.chars_out = 0
+        self.warnings = 0
+        self.in_flight = 0
+        self.started = None
+        self.stats = ConversionStats(self.wylie) if self.count else None
+
+    #  Converts an iterable of lines, yielding (line number, converted line, warnings) in order.
+    #  'first_line' is the line number of the first line.
+    def run(self, lines, first_line=1):
+        self.resetCounters()
+        self.started = time.time()
+        if not self.workers:
+            for args in self.batches(lines, first_line):
+                for item in self.collect(args[2], *_convertBatch(self.wylie, *args)):
+                    yield item
+            return
+
+        if self.executor == "thread":
+            pool = ThreadPoolExecutor(self.workers)
+            wylie = self.wylie
+
+            def submit(args):
+                return pool.submit(_convertBatch, wylie, *args)
+        else:
+            pool = ProcessPoolExecutor(self.workers)
+
+            def submit(args):
+                return pool.submit(_convertBatchShared, args)
+
+        pending = collections.deque()
+        try:
+            for args in self.batches(lines, first_line):
+                # back-pressure: wait for the oldest batch before reading more input
+                while len(pending) >= self.window:
+                    for item in self.finish(pending):
+                        yield item
+                pending.append((args[2], submit(args)))
+                self.in_flight += len(args[3])
+            while pending:
+                for item in self.finish(pending):
+                    yield item
+        finally:
+            for _, future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    #  group the input into (direction, escape, first line number, lines, count, skip_blank)
+    #  batch arguments
+    def batches(self, lines, first_line):
+        chunk = []
+        line = first_line
+        for s in lines:
+            chunk.append(s)
+            self.lines_in += 1
+            self.chars_in += len(s)
+            if len(chunk) == self.batch:
+                yield (self.direction, self.escape, line, chunk, self.count, self.skip_blank)
+                line += len(chunk)
+                chunk = []
+        if chunk:
+            yield (self.direction, self.escape, line, chunk, self.count, self.skip_blank)
+
+    def finish(self, pending):
+        first_line, future = pending.popleft()
+        results, stats = future.result()
+        self.in_flight -= len(results)
+        return self.collect(first_line, results, stats)
+
+    def collect(self, first_line, results, stats=None):
+        if stats is not None:
+            self.stats.merge(stats)
+        line = first_line
+        for out, ws in results:
+            self.lines_out += 1
+            self.chars_out += len(out)
+            self.warnings += len(ws)
+            yield line, out, ws
+            line += 1
+
+    #  counters of the current (or last) run
+    def progress(self):
+        elapsed = time.time() - self.started if self.started is not None else 0.0
+        return {
+            "lines_in": self.lines_in,
+            "lines_out": self.lines_out,
+            "in_flight": self.in_flight,
+            "chars_in": self.chars_in,
+            "chars_out": self.chars_out,
+            "warnings": self.warnings,
+            "elapsed": elapsed,
+            "lines_per_sec": self.lines_out / elapsed if elapsed > 0 else 0.0,
+            "chars_per_sec": self.chars_in / elapsed if elapsed > 0 else 0.0,
+        }
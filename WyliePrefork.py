@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import gc
+import os
+from Wylie import Wylie, sharedWylie
+#  Keeping the conversion tables shared between prefork workers (gunicorn, uwsgi...).
+#
+#  Tables built in the master are inherited by the forked workers, but pages holding objects
+#  which the garbage collector tracks get written to in every worker (GC traversal updates
+#  their headers), so each worker soon has its own copy.  preload() makes the tables
+#  GC-untracked and freezes everything the master has allocated so far:
+#    - the tables are loaded (from the serialized tables file if possible)
+#    - list tables (m_special, m_suffixes, m_tib_stacks, m_tokens) and the lists inside the
+#      pair tables (m_superscripts, m_subscripts, m_prefixes, m_suff2) become tuples; tuples
+#      and dicts holding only strings and tuples are untracked by the collector
+#    - gc.freeze() moves all the objects left to the permanent generation, which the
+#      collector of the workers never traverses
+#  Reference counts are still updated for the objects a conversion touches, so a worker ends
+#  up owning the pages of the few tables entries it uses; the rest stay shared.
+#
+#  Use, in the code the master imports before forking (e.g. the gunicorn app module with
+#  preload_app = True, or a gunicorn "on_starting" hook):
+#      import WyliePrefork
+#      WyliePrefork.preload()
+#
+#  uss() returns the unique memory of a process, to check the effect per worker.
+
+
+#  'value' with its lists (and the lists in its dict values) turned into tuples
+def _tuples(value):
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, dict) and any(isinstance(v, list) for v in value.values()):
+        return dict((k, tuple(v) if isinstance(v, list) else v) for k, v in value.items())
+    return value
+
+
+#  make the tables of 'cls' (and of its bases) read-only and GC-untracked
+def freezeTables(cls=Wylie):
+    cls.loadHashes()
+    for name in cls.TABLES:
+        for klass in cls.__mro__:
+            if name in klass.__dict__:
+                setattr(klass, name, _tuples(klass.__dict__[name]))
+                break
+
+
+#  Preload hook for the master process: loads and freezes the tables of 'classes', creates
+#  the process-wide Wylie object and freezes the heap.
+def preload(classes=(Wylie,)):
+    for cls in classes:
+        freezeTables(cls)
+    sharedWylie()
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+
+#  unique set size (private memory) of process 'pid' in bytes, from /proc/<pid>/smaps_rollup;
+#  None where it is not available
+def uss(pid="self"):
+    try:
+        with open("/proc/%s/smaps_rollup" % pid) as f:
+            total = 0
+            for line in f:
+                if line.startswith("Private_Clean:") or line.startswith("Private_Dirty:"):
+                    total += int(line.split()[1]) * 1024
+            return total
+    except (IOError, OSError):
+        return None
+
+
+#  forks 'workers' children, each running 'work' then reporting its unique memory; returns
+#  the list of the children's USS in bytes
+def measureWorkers(work, workers=4):
+    results = []
+    children = []
+    for _ in range(workers):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            try:
+                work()
+                os.write(w, str(uss() or 0).encode("ascii"))
+            finally:
+                os._exit(0)
+        os.close(w)
+        children.append((pid, r))
+    for pid, r in children:
+        with os.fdopen(r) as f:
+            results.append(int(f.read() or 0))
+        os.waitpid(pid, 0)
+    return results
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import re
+from Wylie import sharedWylie
+#  Conversion-free syllable segmentation.
+#
+#  Finds the tsekbars (syllables) of Unicode Tibetan or EWTS text without converting it: no
+#  output string and no warnings are built.  segment*() methods are generators of
+#  (start, end, key) spans, where text[start:end] is the tsekbar and 'key' its normalized form:
+#    - Unicode: the tsekbar with deprecated pre-composed vowels decomposed (as toWylie() does)
+#    - EWTS:    the tsekbar with typographical quotes replaced by "'"
+#  Both patterns are compiled from the conversion tables: for Unicode, a tsekbar is a run of
+#  top letters, subjoined letters, vowel and final signs, ended by a visarga; for EWTS, a run
+#  of tokens which fromWylie() would read as one tsekbar (a consonant or vowel, then
+#  consonants, subjoined letters, vowels, finals, "+", "^" and "."; a visarga "H" ends it).
+#  [comments] and backslash escapes are skipped in EWTS.
+#
+#  Use:
+#      seg = Segmenter()
+#      for start, end, key in seg.segment(text):
+#          ...
+
+#  deprecated pre-composed vowels, which toWylie() decomposes before converting
+PRECOMPOSED = ((u"\u0f76", u"\u0fb2\u0f80"), (u"\u0f77", u"\u0fb2\u0f71\u0f80"),
+               (u"\u0f78", u"\u0fb3\u0f80"), (u"\u0f79", u"\u0fb3\u0f71\u0f80"),
+               (u"\u0f81", u"\u0f71\u0f80"))
+
+#  any character of the Tibetan block, to tell Unicode text from EWTS
+TIBETAN = re.compile(u"[\u0f00-\u0fff]")
+
+
+#  a Unicode tsekbar: a run of letters, subjoined letters, vowel and final signs, ended by a
+#  visarga (as fromWylie() ends a tsekbar after "H")
+def unicodeSyllablePattern(wylie):
+    visarga = wylie.m_final_uni["H"]
+    chars = set(wylie.m_tib_top) | set(wylie.m_tib_subjoined) | set(wylie.m_tib_vowel) | \
+        set(wylie.m_tib_final_wylie) | set(c for c, _ in PRECOMPOSED)
+    chars.discard(visarga)
+    run = u"[" + u"".join(re.escape(c) for c in sorted(chars)) + u"]+"
+    return re.compile(run + re.escape(visarga) + u"?|" + re.escape(visarga))
+
+
+def normalizeUnicode(s):
+    for a, b in PRECOMPOSED:
+        s = s.replace(a, b)
+    return s
+
+
+#  alternation of EWTS tokens, longest first (like the tokenizer)
+def _alternation(tokens):
+    return u"(?:" + u"|".join(re.escape(t) for t in sorted(tokens, key=lambda t: (-len(t), t))) + u")"
+
+
+#  Scanner for EWTS: matches a tsekbar (group "syl"), or a backslash escape or the start of a
+#  [comment] (to skip them).
+def wylieScannerPattern(wylie):
+    start = set(wylie.m_consonant) | set(wylie.m_vowel)
+    joined = set(wylie.m_consonant) | set(wylie.m_subjoined)
+    body = start | set(wylie.m_subjoined) | set(wylie.m_final_uni)
+    body.discard("H")
+    syl = (_alternation(start) +
+           u"(?:" + _alternation(body) + u"|[+.](?=" + _alternation(joined) + u"))*" +
+           u"(?:H" + _alternation(set(wylie.m_final_uni)) + u"*)?")
+    return re.compile(u"(?P<syl>" + syl + u")|\\\\(?:u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)|\\[", re.S)
+
+
+#  brackets and escapes inside a [comment]
+COMMENT_SCAN = re.compile(u"\\\\.|[\\[\\]]", re.S)
+
+
+class Segmenter(object):
+
+    def __init__(self, wylie=None):
+        wylie = wylie if wylie is not None else sharedWylie()
+        self.unicode_pattern = unicodeSyllablePattern(wylie)
+        self.wylie_pattern = wylieScannerPattern(wylie)
+
+    #  tsekbars of Unicode text
+    def segmentUnicode(self, text):
+        precomposed = set(c for c, _ in PRECOMPOSED)
+        for m in self.unicode_pattern.finditer(text):
+            key = m.group()
+            if precomposed.intersection(key):
+                key = normalizeUnicode(key)
+            yield m.start(), m.end(), key
+
+    #  tsekbars of EWTS text
+    def segmentWylie(self, text):
+        search = self.wylie_pattern.search
+        pos = 0
+        n = len(text)
+        while pos < n:
+            m = search(text, pos)
+            if m is None:
+                return
+            pos = m.end()
+            if m.lastgroup == "syl":
+                key = m.group()
+                if u"\u2018" in key or u"\u2019" in key:
+                    key = key.replace(u"\u2018", "'").replace(u"\u2019", "'")
+                yield m.start(), pos, key
+            elif m.group() == "[":
+                pos = self.skipComment(text, pos)
+
+    #  position after the "]" closing a [comment] whose content starts at 'pos' (nested
+    #  brackets and escapes included), or the end of the text if it is unfinished
+    def skipComment(self, text, pos):
+        nesting = 1
+        for m in COMMENT_SCAN.finditer(text, pos):
+            c = m.group()
+            if c == "[":
+                nesting += 1
+            elif c == "]":
+                nesting -= 1
+                if nesting == 0:
+                    return m.end()
+        return len(text)
+
+    #  tsekbars of text in either script: Unicode if it has any Tibetan character, else EWTS
+    def segment(self, text):
+        if self.isUnicode(text):
+            return self.segmentUnicode(text)
+        return self.segmentWylie(text)
+
+    def isUnicode(self, text):
+        return TIBETAN.search(text) is not None
+
+
+_shared = None
+
+
+#  a process-wide Segmenter with the default tables, created on first use
+def sharedSegmenter():
+    global _shared
+    if _shared is None:
+        _shared = Segmenter()
+    return _shared
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import asyncio
+import collections
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Wylie import BudgetExceeded, sharedWylie
+#  Asyncio HTTP conversion service with request micro-batching.
+#
+#  Endpoints:
+#    POST /fromWylie, POST /toWylie
+#        body application/json: {"text": "..."}    => {"result": "...", "warnings": [...]}
+#                               {"texts": [...]}   => {"results": [...], "warnings": [[...], ...]}
+#        any other body is taken as plain UTF-8 text and answered as plain text
+#    GET /stats
+#        request and batch counters, queue depth and latency percentiles
+#
+#  Concurrent requests are queued and coalesced into micro-batches (up to 'batch_size'
+#  texts, waiting at most 'max_delay' seconds for more), which are converted on a pool of
+#  worker threads sharing one Wylie object.  With 'budget' (seconds per text), a text which
+#  takes longer to convert is answered with 422 instead of holding a worker.
+#
+#  Run:  python WylieServer.py --port 8080
+#  (listens on localhost only unless --host is given)
+
+DIRECTIONS = ("fromWylie", "toWylie")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+           431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+
+
+#  convert one batch of (direction, text) items: returns [(result, warnings), ...], with the
+#  BudgetExceeded exception in place of the result of a text which ran over the budget
+def _convertItems(wylie, items, budget=None):
+    ret = []
+    for direction, text in items:
+        ws = []
+        try:
+            if direction == "fromWylie":
+                ret.append((wylie.fromWylie(text, ws, 1, budget), ws))
+            else:
+                ret.append((wylie.toWylieOptions(text, ws, True, 1, budget), ws))
+        except BudgetExceeded as e:
+            ret.append((e, ws))
+    return ret
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+#  Limits of the request head: 'max_headers' header lines, and 'max_header_bytes' for the
+#  request line and the headers together (also the longest line the stream reader buffers).
+class WylieServer(object):
+
+    def __init__(self, host="127.0.0.1", port=8080, workers=4, batch_size=64, max_delay=0.002,
+                 max_body=16 << 20, wylie=None, budget=None, max_headers=100, max_header_bytes=64 << 10):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_body = max_body
+        self.max_headers = max_headers
+        self.max_header_bytes = max_header_bytes
+        self.budget = budget
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        self.pool = None
+        self.server = None
+        self.queue = None
+        self.batcher = None
+        self.slots = None
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_texts = 0
+        # latencies of the most recent requests, in seconds
+        self.latencies = collections.deque(maxlen=10000)
+
+    #  start listening; returns the bound port (useful with port=0)
+    async def start(self):
+        self.pool = ThreadPoolExecutor(self.workers)
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.workers)
+        self.batcher = asyncio.ensure_future(self.batchLoop())
+        self.server = await asyncio.start_server(self.handle, self.host, self.port,
+                                                 limit=self.max_header_bytes)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        try:
+            await self.batcher
+        except asyncio.CancelledError:
+            pass
+        self.pool.shutdown(wait=True)
+
+    async def serveForever(self):
+        await self.start()
+        print("Wylie conversion service on http://%s:%d/" % (self.host, self.port))
+        async with self.server:
+            await self.server.serve_forever()
+
+    #  queue texts for conversion; returns [(result, warnings), ...] once their batch is done
+    async def convert(self, direction, texts):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            f = loop.create_future()
+            self.queue.put_nowait((direction, text, f))
+            futures.append(f)
+        results = await asyncio.gather(*futures)
+        for result, _ in results:
+            if isinstance(result, BudgetExceeded):
+                raise HttpError(422, str(result))
+        return results
+
+    #  coalesce queued texts into batches and hand them to the worker threads
+    async def batchLoop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            self.batches += 1
+            self.batched_texts += len(batch)
+            asyncio.ensure_future(self.runBatch(batch))
+
+    async def runBatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, _convertItems, self.wylie,
+                                                 [(d, t) for d, t, _ in batch], self.budget)
+            for (_, _, f), r in zip(batch, results):
+                if not f.done():
+                    f.set_result(r)
+        except Exception as e:
+            for _, _, f in batch:
+                if not f.done():
+                    f.set_exception(e)
+        finally:
+            self.slots.release()
+
+    def percentile(self, values, p):
+        if not values:
+            return 0.0
+        k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+        return values[k]
+
+    def stats(self):
+        lat = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "batches": self.batches,
+            "avg_batch": float(self.batched_texts) / self.batches if self.batches else 0.0,
+            "latency_ms": dict(("p%d" % p, self.percentile(lat, p) * 1e3) for p in (50, 90, 99)),
+        }
+
+    #  one HTTP/1.1 connection, with keep-alive
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self.readRequest(reader)
+                except HttpError as e:
+                    # the rest of the request cannot be delimited: answer, then close
+                    self.errors += 1
+                    await self.respond(writer, e.status, "text/plain; charset=utf-8",
+                                       str(e).encode("utf-8"), False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                start = time.time()
+                try:
+                    status, ctype, payload = await self.dispatch(method, path, headers, body)
+                except HttpError as e:
+                    status, ctype, payload = e.status, "text/plain; charset=utf-8", str(e).encode("utf-8")
+                    self.errors += 1
+                except Exception as e:
+                    status, ctype, payload = 500, "text/plain; charset=utf-8", str(e).encode("utf-8")
+                    self.errors += 1
+                if path != "/stats":
+                    self.requests += 1
+                    self.latencies.append(time.time() - start)
+                keep = headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, ctype, payload, keep)
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, ctype, payload, keep):
+        writer.write(("HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n"
+                      "Connection: %s\r\n\r\n" % (status, REASONS.get(status, ""), ctype, len(payload),
+                                                  "keep-alive" if keep else "close")).encode("ascii"))
+        writer.write(payload)
+        await writer.drain()
+
+    #  one line of the request head; a line longer than the stream limit is an HttpError
+    async def readLine(self, reader, status, message):
+        try:
+            return await reader.readline()
+        except ValueError:
+            # LimitOverrunError: the reader has dropped the line, the request cannot be read
+            raise HttpError(status, message)
+
+    #  returns (method, path, headers, body), or None at the end of the connection
+    async def readRequest(self, reader):
+        line = await self.readLine(reader, 400, "Request line too long.")
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise HttpError(400, "Bad request line.")
+        method, path = parts[0], parts[1]
+        headers = {}
+        count = 0
+        size = len(line)
+        while True:
+            line = await self.readLine(reader, 431, "Request header fields too large.")
+            if line in (b"\r\n", b"\n", b""):
+                break
+            count += 1
+            size += len(line)
+            if count > self.max_headers or size > self.max_header_bytes:
+                raise HttpError(431, "Request header fields too large.")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length.")
+        if length > self.max_body:
+            raise HttpError(413, "Request body too large.")
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    async def dispatch(self, method, path, headers, body):
+        path = path.split("?", 1)[0]
+        if path == "/stats":
+            return 200, "application/json", json.dumps(self.stats()).encode("utf-8")
+        direction = path.strip("/")
+        if direction not in DIRECTIONS:
+            raise HttpError(404, "Unknown endpoint: " + path)
+        if method != "POST":
+            raise HttpError(405, "Use POST.")
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise HttpError(400, "Body is not valid UTF-8.")
+
+        if not headers.get("content-type", "").startswith("application/json"):
+            (result, _), = await self.convert(direction, [text])
+            return 200, "text/plain; charset=utf-8", result.encode("utf-8")
+
+        try:
+            req = json.loads(text)
+        except ValueError:
+            raise HttpError(400, "Invalid JSON.")
+        if isinstance(req, dict) and isinstance(req.get("texts"), list) and \
+                all(isinstance(t, str) for t in req["texts"]):
+            results = await self.convert(direction, req["texts"])
+            resp = {"results": [r for r, _ in results], "warnings": [w for _, w in results]}
+        elif isinstance(req, dict) and isinstance(req.get("text"), str):
+            (result, ws), = await self.convert(direction, [req["text"]])
+            resp = {"result": result, "warnings": ws}
+        else:
+            raise HttpError(400, "Expected {\"text\": string} or {\"texts\": [string, ...]}.")
+        return 200, "application/json", json.dumps(resp, ensure_ascii=False).encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wylie conversion service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-delay", type=float, default=0.002, help="seconds to wait to fill a batch")
+    parser.add_argument("--budget", type=float, default=None, help="time limit per text, in seconds")
+    args = parser.parse_args(argv)
+    server = WylieServer(args.host, args.port, args.workers, args.batch_size, args.max_delay,
+                         budget=args.budget)
+    try:
+        asyncio.run(server.serveForever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import io
+import sys
+from Wylie import WarningAggregator, sharedWylie
+from WylieSegment import TIBETAN, Segmenter, normalizeUnicode
+from WylieTypeAhead import validSyllables
+from WylieValidate import Validator
+#  Nearest valid syllables, to suggest corrections for invalid syllables
+#  (OCR errors, typos).
+#
+#  The valid syllables are the inventory implied by the prefix, superscript, subscript, suffix
+#  and second suffix tables (see WylieTypeAhead.validSyllables()).  They are indexed with a
+#  symmetric-deletion index: every string obtained by deleting up to 'max_distance' characters
+#  from a valid syllable maps to the syllables it comes from.  Two strings within that edit
+#  distance always share such a deletion, so the candidates for a query are found by looking
+#  up its own deletions (a few dozen dict lookups, instead of a scan of the inventory), then
+#  ranked by their true edit distance (insertions, deletions, substitutions and transpositions
+#  of adjacent characters), by closeness in length and alphabetically.  Results are cached per
+#  distinct syllable.
+#
+#  Unicode queries are searched in a second index of the same syllables in Unicode, built on
+#  the first such query, so that distances count code points: an OCR error on a stack is one
+#  edit there, while its EWTS spelling can differ by several letters.
+#
+#  Use:
+#      s = Suggester()
+#      s.suggest("bsgrubz")          # => [("bsgrubs", 1), ("bsgrub", 1), ...]
+#      s.suggest(u"བསྒྲུབཟ")          # Unicode queries get Unicode suggestions
+#      s.suggestions(text)           # => {"bsgrubz": [...], ...} for every invalid syllable
+#
+#  or from the command line:  python WylieSuggest.py -k 3 ocr/*.txt
+
+#  distinct queries remembered; the cache is cleared when it grows past this
+MAX_CACHE = 100000
+
+
+#  all the strings obtained by deleting up to 'n' characters from 's', 's' included
+def deletions(s, n):
+    ret = set([s])
+    edge = [s]
+    for _ in range(n):
+        nxt = []
+        for x in edge:
+            for i in range(len(x)):
+                d = x[:i] + x[i + 1:]
+                if d not in ret:
+                    ret.add(d)
+                    nxt.append(d)
+        edge = nxt
+    return ret
+
+
+#  edit distance between 'a' and 'b' counting adjacent transpositions as one edit (optimal
+#  string alignment), or limit + 1 if it is more than 'limit'.  Only the diagonal band of
+#  width 'limit' is computed.
+def editDistance(a, b, limit):
+    la = len(a)
+    lb = len(b)
+    if abs(la - lb) > limit:
+        return limit + 1
+    big = limit + 1
+    prev2 = None
+    prev = [j if j <= limit else big for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        cur = [big] * (lb + 1)
+        if i <= limit:
+            cur[0] = i
+        ca = a[i - 1]
+        best = big
+        for j in range(max(1, i - limit), min(lb, i + limit) + 1):
+            d = prev[j - 1] if ca == b[j - 1] else prev[j - 1] + 1
+            if prev[j] + 1 < d:
+                d = prev[j] + 1
+            if cur[j - 1] + 1 < d:
+                d = cur[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1] and prev2[j - 2] + 1 < d:
+                d = prev2[j - 2] + 1
+            cur[j] = d
+            if d < best:
+                best = d
+        if best > limit:
+            return big
+        prev2 = prev
+        prev = cur
+    return min(prev[lb], big)
+
+
+#  The symmetric-deletion index of the valid syllables of 'wylie', in EWTS or in Unicode:
+#  (syllables, index) where index[n] maps each deletion of the syllables of length n to the
+#  position of one of them in 'syllables', or to a tuple of positions if there are several.
+#  Keeping the lengths apart bounds how many characters were deleted on the syllable side of
+#  a match.
+def buildIndex(wylie, max_distance, unicode=False):
+    syllables = validSyllables(wylie)
+    if unicode:
+        syllables = set(wylie.fromWylie(syl) for syl in syllables)
+    syllables = sorted(syllables)
+    index = [{} for _ in range(max(len(syl) for syl in syllables) + 1)]
+    for n, syl in enumerate(syllables):
+        table = index[len(syl)]
+        for d in deletions(syl, max_distance):
+            ids = table.get(d)
+            if ids is None:
+                table[d] = n
+            elif isinstance(ids, int):
+                table[d] = [ids, n]
+            else:
+                ids.append(n)
+    for table in index:
+        for d, ids in table.items():
+            if not isinstance(ids, int):
+                table[d] = tuple(ids)
+    return tuple(syllables), tuple(index)
+
+
+_indexes = {}
+
+
+#  the index for the tables of 'wylie', built on first use
+def suggestionIndex(wylie, max_distance=2, unicode=False):
+    key = (type(wylie), max_distance, unicode)
+    ret = _indexes.get(key)
+    if ret is None:
+        ret = _indexes[key] = buildIndex(wylie, max_distance, unicode)
+    return ret
+
+
+class Suggester(object):
+
+    def __init__(self, wylie=None, max_distance=2):
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        self.max_distance = max_distance
+        self.syllables, self.index = suggestionIndex(self.wylie, max_distance)
+        self.valid = frozenset(self.syllables)
+        self.valid_unicode = None
+        self.cache = {}
+        self.segmenter = Segmenter(self.wylie)
+        self.validator = Validator(self.wylie)
+
+    #  (syllables, index) to search for EWTS or Unicode queries
+    def searchIndex(self, unicode):
+        if not unicode:
+            return self.syllables, self.index
+        return suggestionIndex(self.wylie, self.max_distance, True)
+
+    #  The 'k' best corrections of one syllable: the valid syllables nearest to it, as
+    #  [(syllable, edit distance), ...], best first, EWTS for an EWTS query and Unicode for a
+    #  Unicode one.  A valid syllable is its own best suggestion.  The search starts with exact
+    #  matches and allows one more edit at a time, up to max_distance, until it has 'k' of
+    #  them: the closest ones have the fewest candidates.
+    def suggest(self, syl, k=5):
+        key = (syl, k)
+        ret = self.cache.get(key)
+        if ret is not None:
+            return ret
+        unicode = TIBETAN.search(syl) is not None
+        if unicode:
+            query = normalizeUnicode(syl)
+        else:
+            # typographical quotes, as in the ambiguous syllable check of fromWylieOneTsekbar()
+            query = syl.replace(u"\u2018", "'").replace(u"\u2019", "'")
+        syllables, index = self.searchIndex(unicode)
+        max_distance = self.max_distance
+        n = len(query)
+        dels = deletions(query, max_distance)
+        # syllable position => edit distance (max_distance + 1 if more; None until needed)
+        found = {}
+        for limit in range(max_distance + 1):
+            for length in range(max(0, n - limit), min(len(index) - 1, n + limit) + 1):
+                table = index[length]
+                for d in dels:
+                    # characters deleted from the query and from the syllable: pairs with
+                    # both below 'limit' were looked up at a lower limit
+                    i = n - len(d)
+                    j = length - len(d)
+                    if i > limit or j > limit or (i < limit and j < limit):
+                        continue
+                    ids = table.get(d)
+                    if ids is None:
+                        continue
+                    for p in ((ids,) if isinstance(ids, int) else ids):
+                        if p not in found:
+                            # nothing within limit - 1 edits is first reached now, so only
+                            # insertions (or only deletions) make exactly 'limit' edits
+                            found[p] = limit if i == 0 or j == 0 else None
+            ranked = [(dist, abs(len(syllables[p]) - n), syllables[p])
+                      for p, dist in found.items() if dist is not None and dist < limit]
+            # the candidates at 'limit' edits, in rank order: the distance of those which need
+            # substitutions is only computed as long as more suggestions are needed
+            level = [(abs(len(syllables[p]) - n), syllables[p], p)
+                     for p, dist in found.items() if dist is None or dist == limit]
+            level.sort()
+            for closeness, candidate, p in level:
+                if len(ranked) >= k:
+                    break
+                if found[p] is None:
+                    found[p] = editDistance(query, candidate, max_distance)
+                if found[p] == limit:
+                    ranked.append((limit, closeness, candidate))
+            if len(ranked) >= k:
+                break
+        ranked.sort()
+        if len(self.cache) >= MAX_CACHE:
+            self.cache.clear()
+        ret = self.cache[key] = [(candidate, dist) for dist, _, candidate in ranked[:k]]
+        return ret
+
+    #  The suggestions for the invalid syllables of 'str_': {syllable: [(suggestion, edit
+    #  distance), ...]}.  In EWTS these are the syllables which fromWylie() warns about ('warns',
+    #  if given, is a WarningAggregator which also receives the warnings).  toWylie() reads any
+    #  Unicode tsekbar without complaint, so in Unicode text they are the tsekbars which are not
+    #  in the inventory, Sanskrit ones included.
+    def suggestions(self, str_, k=5, warns=None):
+        ret = {}
+        if TIBETAN.search(str_) is not None:
+            if self.valid_unicode is None:
+                self.valid_unicode = frozenset(self.searchIndex(True)[0])
+            for start, end, key in self.segmenter.segmentUnicode(str_):
+                if key not in ret and key not in self.valid_unicode:
+                    ret[key] = self.suggest(key, k)
+            return ret
+        agg = warns if warns is not None else WarningAggregator()
+        self.validator.validateWylie(str_, agg)
+        for message, syllable in agg.problems:
+            if syllable is not None and syllable not in ret and syllable not in self.valid:
+                ret[syllable] = self.suggest(syllable, k)
+        return ret
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suggest corrections for the invalid syllables of Unicode or EWTS documents")
+    parser.add_argument("-k", type=int, default=5, help="number of suggestions per syllable")
+    parser.add_argument("--max-distance", type=int, default=2, help="maximum edit distance")
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+    s = Suggester(max_distance=args.max_distance)
+    for path in args.files:
+        with io.open(path, encoding="utf-8") as f:
+            text = f.read()
+        for syllable, suggestions in sorted(s.suggestions(text, args.k).items()):
+            print("%s: %s: %s" % (path, syllable, " ".join(c for c, _ in suggestions) or "-"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
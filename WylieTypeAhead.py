@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+from Wylie import sharedWylie
+#  Prefix-incremental Wylie input conversion, for type-ahead search boxes.
+#
+#  TypeAhead keeps the query split into a stable part (complete syllables and the separators
+#  after them, converted once) and the trailing syllable which is still being typed.  Each
+#  keystroke only re-converts that trailing syllable, so its cost does not grow with the
+#  length of the query; warnings are only reported for completed syllables, never for an
+#  incomplete one ("Vowel expected ...").
+#
+#  Completions of the trailing syllable come from an inventory of well-formed Tibetan
+#  syllables generated from the tables (prefixes, superscripts, subscripts, stacks, vowels,
+#  suffixes and second suffixes), shortest first.
+#
+#  Use:
+#      ta = TypeAhead()
+#      for c in "bsgrub":
+#          ta.append(c)
+#      ta.stablePrefix(), ta.current(), ta.completions()
+#      # => (u"", ("bsgrub", u"བསྒྲུབ"), [("bsgrub", u"བསྒྲུབ"), ("bsgrubs", u"བསྒྲུབས"), ...])
+
+VOWELS = ("a", "i", "u", "e", "o")
+
+#  endings which follow a syllable without a suffix (genitive, connectives...)
+AFTER_VOWEL = ("'i", "'o", "'u", "'is", "'am")
+
+
+#  The inventory of well-formed syllables implied by the tables, as a set of EWTS strings.
+#  Only syllables which convert back to themselves without warnings are kept: an onset and
+#  vowel is checked once, and its endings one by one only if it fails ("gda" should probably
+#  be "gad", but "gdams" is fine) or if a prefix letter followed by "a" could be read the
+#  other way ("dags" should probably be "dgas").
+def validSyllables(wylie):
+    letters = set(["a"])
+    for table in (wylie.m_prefixes, wylie.m_superscripts, wylie.m_subscripts):
+        for key, values in table.items():
+            letters.add(key)
+            for v in values:
+                letters.update(v.split("+"))
+    for stack in wylie.m_tib_stacks:
+        letters.update(stack.split("+"))
+    letters = set(x for x in letters if x.isalpha() or x == "'")
+
+    stacks = set(letters)
+    for sup, below in wylie.m_superscripts.items():
+        stacks.update(sup + b.replace("+", "") for b in below)
+    for sub, above in wylie.m_subscripts.items():
+        stacks.update(a.replace("+", "") + sub for a in above)
+    stacks.update(s.replace("+", "") for s in wylie.m_tib_stacks)
+    onsets = set(stacks)
+    for pre, after in wylie.m_prefixes.items():
+        if pre in letters:
+            onsets.update(pre + a.replace("+", "") for a in after)
+
+    def roundTrips(syl):
+        warns = []
+        return wylie.toWylie(wylie.fromWylie(syl, warns)) == syl and not warns
+
+    suffixes = sorted(s for s in wylie.m_suffixes if s in letters)
+    codas = [""] + suffixes
+    for s2, before in sorted(wylie.m_suff2.items()):
+        codas.extend(s + s2 for s in sorted(before) if s in suffixes)
+    endings = codas + list(AFTER_VOWEL)
+    syllables = set()
+    for onset in onsets:
+        for v in VOWELS:
+            base = onset + v
+            if roundTrips(base) and not (v == "a" and onset in wylie.m_prefixes):
+                syllables.update(base + e for e in endings)
+            else:
+                syllables.update(base + e for e in endings if e and roundTrips(base + e))
+    return syllables
+
+
+#  Builds the completion table: partial syllable => the first 'k' syllables extending it,
+#  shortest first.
+def buildCompletions(wylie, k):
+    table = {}
+    for syl in sorted(validSyllables(wylie), key=lambda s: (len(s), s)):
+        for n in range(1, len(syl) + 1):
+            lst = table.setdefault(syl[:n], [])
+            if len(lst) < k:
+                lst.append(syl)
+    return table
+
+
+_completions = {}
+
+
+#  the completion table for the tables of 'wylie', built on first use
+def completionTable(wylie, k=10):
+    key = (type(wylie), k)
+    table = _completions.get(key)
+    if table is None:
+        table = _completions[key] = buildCompletions(wylie, k)
+    return table
+
+
+class TypeAhead(object):
+
+    def __init__(self, wylie=None, max_completions=10):
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        self.max_completions = max_completions
+        w = self.wylie
+        chars = set("+.^")
+        for table in (w.m_consonant, w.m_subjoined, w.m_vowel, w.m_final_uni):
+            for token in table:
+                chars.update(token)
+        self.syllable_chars = frozenset(chars)
+        self.cache = {}
+        self.reset()
+
+    def reset(self):
+        self.typed = ""
+        self.stable = ""       # Unicode of the stable part
+        self.pending = ""      # separators after the last complete syllable, not converted yet
+        self.syl = ""          # the syllable being typed
+        self.nesting = 0       # [comment] nesting in 'pending'
+        self.escape = 0        # characters left in a backslash escape in 'pending'
+        self.line = 1
+        self.warns = []
+        self.history = []
+
+    #  add typed characters
+    def append(self, chars):
+        for c in chars:
+            self.history.append((self.stable, self.pending, self.syl, self.nesting, self.escape,
+                                 self.line, len(self.warns)))
+            self.typed += c
+            self.appendChar(c)
+        return self
+
+    #  remove the last 'n' typed characters
+    def backspace(self, n=1):
+        while n > 0 and self.history:
+            (self.stable, self.pending, self.syl, self.nesting, self.escape,
+             self.line, nwarns) = self.history.pop()
+            del self.warns[nwarns:]
+            self.typed = self.typed[:-1]
+            n -= 1
+        return self
+
+    def appendChar(self, c):
+        if self.escape:
+            # -1: just after the backslash
+            if self.escape == -1:
+                self.escape = 4 if c == "u" else 8 if c == "U" else 0
+            else:
+                self.escape -= 1
+            self.pending += c
+            return
+        if self.nesting or c not in self.syllable_chars:
+            if self.syl:
+                self.stable += self.convert(self.syl)
+                self.syl = ""
+            self.pending += c
+            if c == "\\":
+                self.escape = -1
+            elif c == "[":
+                self.nesting += 1
+            elif c == "]" and self.nesting:
+                self.nesting -= 1
+            return
+        if self.pending:
+            # separators are converted as a run, as multi-character tokens ("//") and
+            # [comments] span several keystrokes
+            self.stable += self.convert(self.pending, True)
+            self.pending = ""
+        self.syl += c
+
+    #  convert a completed piece, keeping its warnings
+    def convert(self, piece, separators=False):
+        warns = []
+        # a zero-width space keeps fix_spacing from stripping spaces which are not at the
+        # start of the query (it converts to nothing)
+        text = u"\u200b" + piece if separators and self.stable else piece
+        out = self.wylie.fromWylie(text, warns, self.line)
+        self.warns.extend(w for w in warns if w != "No Tibetan characters found!")
+        self.line += piece.count("\n")
+        return out
+
+    #  Unicode of the complete syllables typed so far; it does not change with later keystrokes
+    def stablePrefix(self):
+        return self.stable
+
+    #  the syllable being typed, as (wylie, unicode)
+    def current(self):
+        if not self.syl:
+            return ("", "")
+        return (self.syl, self.syllableUnicode(self.syl))
+
+    #  the whole query converted, with the trailing syllable as typed so far
+    def unicode(self):
+        tail = self.wylie.fromWylie(u"\u200b" + self.pending if self.stable else self.pending, []) \
+            if self.pending else ""
+        return self.stable + tail + self.current()[1]
+
+    #  completions of the syllable being typed: [(wylie, unicode), ...], shortest first
+    def completions(self):
+        if not self.syl:
+            return []
+        key = self.syl.replace(u"\u2018", "'").replace(u"\u2019", "'")
+        table = completionTable(self.wylie, self.max_completions)
+        return [(s, self.syllableUnicode(s)) for s in table.get(key, ())]
+
+    #  warnings of the completed syllables
+    def warnings(self):
+        return list(self.warns)
+
+    def syllableUnicode(self, syl):
+        uni = self.cache.get(syl)
+        if uni is None:
+            if len(self.cache) > 10000:
+                self.cache.clear()
+            uni = self.cache[syl] = self.wylie.fromWylie(syl, [])
+        return uni
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import io
+import re
+import sys
+from Wylie import WarningAggregator, sharedWylie
+from WylieSegment import TIBETAN, normalizeUnicode
+#  Validation of Unicode Tibetan or EWTS text, without converting it.
+#
+#  The text is cut in one regular expression pass into pieces which the converter reads the
+#  same way wherever they occur: Unicode tsekbars (as toWylieOptions() delimits them), and in
+#  EWTS runs of tsekbar tokens and the text between them.  Each distinct piece is checked once
+#  by the converter itself (the prefix/suffix state machine of fromWylieOneTsekbar(), the sign
+#  ordering checks of toWylieOneStack()...).  Its problems are remembered, and replayed with
+#  the right line numbers for every later occurrence, so the warnings are exactly those the
+#  conversion would report, in the same order, but no output is built for the document.
+#  The only context that matters, a [comment] which toWylieOptions() opens for non-Tibetan
+#  text and which swallows stray signs, is tracked between pieces.
+#
+#  validate*() stop after 'max_errors' warnings if it is given, and return the number of
+#  warnings reported: 0 means that the text is well formed.
+#
+#  Use:
+#      v = Validator()
+#      warns = []
+#      if v.validateWylie(text, warns, max_errors=10):
+#          reject(warns)
+
+#  distinct pieces remembered per direction; the cache is cleared when it grows past this
+MAX_CACHE = 100000
+
+NO_TIBETAN = "No Tibetan characters found!"
+
+#  backslash escapes, as the fromWylie() tokenizer reads them
+ESCAPE = u"\\\\(?:u.{4}|U.{8}|.)"
+
+#  escapes and brackets inside a [comment]
+COMMENT_SCAN = re.compile(ESCAPE + u"|[\\[\\]]", re.S)
+
+
+#  number of line breaks in s[start:end], "\r\n" counting as one like in the conversions
+def lineBreaks(s, start=0, end=None):
+    if end is None:
+        end = len(s)
+    return s.count("\n", start, end) + s.count("\r", start, end) - s.count("\r\n", start, end)
+
+
+#  records the warnings of a conversion as (message, syllable, line), in order
+class WarningRecorder(WarningAggregator):
+
+    def __init__(self):
+        WarningAggregator.__init__(self)
+        self.records = []
+
+    def add(self, message, syllable=None, line=None):
+        self.records.append((message, syllable, line))
+
+
+class Validator(object):
+
+    def __init__(self, wylie=None):
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        self.wylie_cache = {}
+        self.unicode_cache = {}
+        self.unicode_pattern = self.unicodeTsekbarPattern()
+        self.wylie_pattern = self.wylieRunPattern()
+
+    #  EWTS scanner matching runs of the tokens which fromWylie() reads as tsekbars (letters,
+    #  vowels, finals, "+", "." and "^"; group "run"), and escapes and "[" outside of them.  A
+    #  run is converted the same way whatever surrounds it.
+    def wylieRunPattern(self):
+        w = self.wylie
+        tokens = set(w.m_consonant) | set(w.m_subjoined) | set(w.m_vowel) | set(w.m_final_uni)
+        tokens.update(("+", ".", "^"))
+        alt = u"|".join(re.escape(t) for t in sorted(tokens, key=lambda t: (-len(t), t)))
+        return re.compile(u"(?P<run>(?:" + alt + u")+)|" + ESCAPE + u"|\\[", re.S)
+
+    #  Unicode tsekbars as toWylieOptions() reads them: stacks (a letter and the signs below and
+    #  after it), the last one possibly with a visarga and more signs after it; or a run of
+    #  stray signs, which it reads one by one
+    def unicodeTsekbarPattern(self):
+        w = self.wylie
+        signs = set(w.m_tib_subjoined) | set(w.m_tib_vowel) | set(w.m_tib_final_wylie)
+        visarga = w.m_final_uni["H"]
+
+        def charClass(chars):
+            return u"[" + u"".join(re.escape(c) for c in sorted(chars)) + u"]"
+        top = charClass(w.m_tib_top)
+        sign = charClass(signs)
+        sign_not_h = charClass(signs - set([visarga]))
+        return re.compile(u"(?:" + top + sign_not_h + u"*)+(?:" + re.escape(visarga) + sign + u"*)?|" +
+                          sign + u"+")
+
+    #  the warnings of one piece of EWTS, as ((message, syllable, line offset), ...), whether
+    #  it has any Tibetan, and its number of line breaks
+    def wyliePiece(self, piece):
+        ret = self.wylie_cache.get(piece)
+        if ret is not None:
+            return ret
+        w = self.wylie
+        rec = WarningRecorder()
+        w.fromWylie(piece, rec)
+        # fromWylie() drops the leading spaces, and line breaks, with fix_spacing
+        skipped = 0
+        if w.fix_spacing:
+            skipped = lineBreaks(piece, 0, len(piece) - len(piece.lstrip()))
+        records = tuple((m, s, line - 1 + skipped) for m, s, line in rec.records if line is not None)
+        units = (NO_TIBETAN, None, None) not in rec.records
+        if len(self.wylie_cache) >= MAX_CACHE:
+            self.wylie_cache.clear()
+        ret = self.wylie_cache[piece] = (records, units, lineBreaks(piece))
+        return ret
+
+    #  the warnings of one Unicode tsekbar, as ((message, syllable, line offset), ...)
+    def unicodePiece(self, piece):
+        ret = self.unicode_cache.get(piece)
+        if ret is not None:
+            return ret
+        rec = WarningRecorder()
+        self.wylie.toWylieOptions(piece, rec, True)
+        if len(self.unicode_cache) >= MAX_CACHE:
+            self.unicode_cache.clear()
+        ret = self.unicode_cache[piece] = tuple((m, s, line - 1) for m, s, line in rec.records)
+        return ret
+
+    #  report the warnings of a piece starting at 'line'; returns how many were reported
+    def report(self, warns, records, line, limit):
+        w = self.wylie
+        aggregate = isinstance(warns, WarningAggregator)
+        n = 0
+        for message, syllable, offset in records:
+            if n >= limit:
+                break
+            if aggregate:
+                w.warnAggregated(warns, line + offset, syllable, message)
+            elif syllable is not None:
+                w.warnl(warns, line + offset, "\"" + syllable + "\": " + message)
+            else:
+                w.warnl(warns, line + offset, message)
+            n += 1
+        return n
+
+    #  position after the "]" closing a [comment] whose content starts at 'pos', or the end of
+    #  the text if it is unfinished
+    def skipComment(self, s, pos):
+        nesting = 1
+        for m in COMMENT_SCAN.finditer(s, pos):
+            c = m.group()
+            if c == "[":
+                nesting += 1
+            elif c == "]":
+                nesting -= 1
+                if nesting == 0:
+                    return m.end()
+        return len(s)
+
+    #  the pieces of EWTS text: runs of tsekbars and what is between them, in order
+    def wyliePieces(self, s):
+        search = self.wylie_pattern.search
+        n = len(s)
+        start = pos = 0
+        while pos < n:
+            m = search(s, pos)
+            if m is None:
+                break
+            if m.lastgroup == "run":
+                if m.start() > start:
+                    yield s[start:m.start()]
+                yield m.group()
+                start = pos = m.end()
+            elif m.group() == "[":
+                pos = self.skipComment(s, m.end())
+            else:
+                pos = m.end()
+        if start < n:
+            yield s[start:]
+
+    #  checks EWTS text as fromWylie() does; returns the number of warnings
+    def validateWylie(self, str_, warns=None, line=1, max_errors=None):
+        limit = max_errors if max_errors is not None else len(str_) + 1
+        count = 0
+        units = False
+        for piece in self.wyliePieces(str_):
+            records, piece_units, breaks = self.wyliePiece(piece)
+            units = units or piece_units
+            if records:
+                count += self.report(warns, records, line, limit - count)
+                if count >= limit:
+                    return count
+            line += breaks
+        if not units:
+            self.wylie.warn(warns, NO_TIBETAN)
+            count += 1
+        return count
+
+    #  Is a [comment] which toWylieOptions() opened before s[start:end] still open after it?
+    #  Non-Tibetan text (and spaces before it) is escaped into a [comment], which swallows
+    #  everything up to the next letter, punctuation or line break, stray signs included.
+    def commentOpen(self, s, start, end, open_):
+        w = self.wylie
+        i = start
+        # the lookahead for the run of spaces before 'spaces_end' (as in toWylieOptions(): once
+        # per run, looking ahead from every space is quadratic)
+        spaces_end = start
+        spaces_nontib = False
+        while i < end:
+            c = s[i]
+            top = w.tib_top(c) is not None
+            other = w.tib_other(c) is not None and c != " "
+            if open_:
+                if top or other or c == "\r" or c == "\n":
+                    open_ = False
+            elif c == " ":
+                if i >= spaces_end:
+                    spaces_end = i
+                    while spaces_end < len(s) and s[spaces_end] == " ":
+                        spaces_end += 1
+                    spaces_nontib = w.followedByNonTibetan(s, i)
+                open_ = spaces_nontib
+            elif not (top or other or c == "\r" or c == "\n" or c == u"\ufeff" or c == u"\u200b" or
+                      u"\u0f00" <= c <= u"\u0fff"):
+                open_ = True
+            i += 1
+        return open_
+
+    #  checks Unicode text as toWylieOptions() does; returns the number of warnings
+    def validateUnicode(self, str_, warns=None, line=1, max_errors=None):
+        w = self.wylie
+        limit = max_errors if max_errors is not None else len(str_) + 1
+        count = 0
+        # the deprecated signs which toWylieOptions() replaces first
+        str_ = normalizeUnicode(str_).replace(u"\u0f00", u"\u0f68\u0f7c\u0f7e")
+        pos = 0
+        in_comment = False
+        for m in self.unicode_pattern.finditer(str_):
+            start, end = m.span()
+            line += lineBreaks(str_, pos, start)
+            in_comment = self.commentOpen(str_, pos, start, in_comment)
+            pos = end
+            if in_comment:
+                # stray signs are part of the [comment]; a letter ends it
+                if w.tib_top(str_[start]) is None:
+                    continue
+                in_comment = False
+            records = self.unicodePiece(m.group())
+            if records:
+                count += self.report(warns, records, line, limit - count)
+                if count >= limit:
+                    break
+        return count
+
+    #  checks text in either script: Unicode if it has any Tibetan character, else EWTS
+    def validate(self, str_, warns=None, line=1, max_errors=None):
+        if TIBETAN.search(str_) is not None:
+            return self.validateUnicode(str_, warns, line, max_errors)
+        return self.validateWylie(str_, warns, line, max_errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check Unicode or EWTS documents without converting them")
+    parser.add_argument("--max-errors", type=int, default=None, help="stop after this many warnings per file")
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+    v = Validator()
+    failed = 0
+    for path in args.files:
+        with io.open(path, encoding="utf-8") as f:
+            text = f.read()
+        warns = []
+        if v.validate(text, warns, max_errors=args.max_errors):
+            failed += 1
+            for w in warns:
+                print("%s: %s" % (path, w))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
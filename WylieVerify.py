@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import argparse
+import io
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import Wylie as _wylie_module
+from Wylie import sharedWylie
+from WylieSegment import Segmenter, normalizeUnicode
+#  Bulk round-trip verification for corpus QA.
+#
+#  For Unicode corpora, checks that fromWylie(toWylie(x)) == x for every tsekbar x; for Wylie
+#  sources, that toWylie(fromWylie(x)) == x.  Every distinct syllable is checked only once
+#  (optionally in parallel), and each failure is reported once with its number of occurrences
+#  and its first location.  The summary is deterministic JSON, so that the summaries of two
+#  versions of the converter can be diffed.
+#
+#  Syllables are found by WylieSegment, so [comments] and backslash escapes in EWTS are not
+#  taken for syllables.  A syllable whose round trip raises is a failure too, reported with the
+#  error instead of stopping the run.
+#
+#  Use:
+#      python WylieVerify.py --unicode corpus/*.txt > summary.json
+#      python WylieVerify.py --wylie --workers 8 sources/*.txt > summary.json
+
+#  Round-trip a list of distinct syllables: returns [(syllable, round-tripped, error), ...] for
+#  failures, where 'error' is the text of the exception raised by the round trip (and
+#  'round-tripped' None), or None.
+def _checkSyllables(wylie, unicode, syllables):
+    failures = []
+    for s in syllables:
+        try:
+            if unicode:
+                back = wylie.fromWylie(wylie.toWylie(s))
+                ok = back == normalizeUnicode(s)
+            else:
+                back = wylie.toWylie(wylie.fromWylie(s))
+                ok = back == s
+        except Exception as e:
+            failures.append((s, None, "%s: %s" % (type(e).__name__, e)))
+            continue
+        if not ok:
+            failures.append((s, back, None))
+    return failures
+
+
+def _checkSyllablesShared(args):
+    return _checkSyllables(sharedWylie(), *args)
+
+
+class RoundTripVerifier(object):
+
+    #  unicode: True to verify Unicode text, False for Wylie (EWTS) sources
+    #  workers: if > 1, distinct syllables are checked on that many processes (using the default
+    #           Wylie options; 'wylie' only applies to in-process checking)
+    def __init__(self, unicode=True, workers=None, wylie=None):
+        self.unicode = unicode
+        self.workers = workers
+        self.wylie = wylie if wylie is not None else sharedWylie()
+        segmenter = Segmenter(self.wylie)
+        self.segment = segmenter.segmentUnicode if unicode else segmenter.segmentWylie
+        # syllable => [count, first location]
+        self.syllables = {}
+        self.total = 0
+
+    #  count the syllables of 'text'; 'source' names it in the locations
+    def add(self, text, source="<input>"):
+        syllables = self.syllables
+        lineno = 1
+        line_start = 0
+        pos = 0
+        for start, end, s in self.segment(text):
+            newlines = text.count("\n", pos, start)
+            if newlines:
+                lineno += newlines
+                line_start = text.rfind("\n", pos, start) + 1
+            pos = start
+            entry = syllables.get(s)
+            if entry is None:
+                syllables[s] = [1, "%s:%d:%d" % (source, lineno, start - line_start + 1)]
+            else:
+                entry[0] += 1
+            self.total += 1
+
+    def addFile(self, path, encoding="utf-8"):
+        with io.open(path, encoding=encoding) as f:
+            self.add(f.read(), path)
+
+    #  check all distinct syllables; returns the summary
+    def run(self):
+        distinct = sorted(self.syllables)
+        if self.workers and self.workers > 1 and len(distinct) > 1000:
+            chunksize = max(1, len(distinct) // (self.workers * 4) + 1)
+            chunks = [distinct[k: k + chunksize] for k in range(0, len(distinct), chunksize)]
+            with ProcessPoolExecutor(self.workers) as pool:
+                failures = [f for part in pool.map(_checkSyllablesShared, [(self.unicode, c) for c in chunks])
+                            for f in part]
+        else:
+            failures = _checkSyllables(self.wylie, self.unicode, distinct)
+        return self.summary(failures)
+
+    def summary(self, failures):
+        report = []
+        occurrences = 0
+        for s, back, error in sorted(failures, key=lambda f: f[0]):
+            count, first = self.syllables[s]
+            occurrences += count
+            entry = {"syllable": s, "roundtrip": back, "count": count, "first": first}
+            if error is not None:
+                entry["error"] = error
+            report.append(entry)
+        return {
+            "version": _wylie_module.__version__,
+            "direction": "unicode" if self.unicode else "wylie",
+            "syllables": self.total,
+            "distinct": len(self.syllables),
+            "failed_distinct": len(report),
+            "failed_occurrences": occurrences,
+            "failures": report,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-trip verification of Tibetan corpora")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--unicode", action="store_true", default=True, help="Unicode input (default)")
+    group.add_argument("--wylie", action="store_true", help="Wylie (EWTS) input")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+    verifier = RoundTripVerifier(unicode=not args.wylie, workers=args.workers)
+    for path in args.files:
+        verifier.addFile(path)
+    summary = verifier.run()
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=1, sort_keys=True)
+    print()
+    return 1 if summary["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from Wylie import BudgetExceeded, WarningAggregator, Wylie
+from WylieBench import ADVERSARIAL
+
+#  time limit for one adversarial input: linear conversions take a few milliseconds, a
+#  quadratic one or an endless loop runs out of it
+BUDGET = 5
+
+
+@pytest.mark.parametrize("direction,name,make", ADVERSARIAL, ids=[d + ": " + n for d, n, _ in ADVERSARIAL])
+def test_adversarial_inputs_finish(direction, name, make):
+    w = Wylie()
+    text = make(20000)
+    try:
+        if direction == "fromWylie":
+            w.fromWylie(text, [], budget=BUDGET)
+        else:
+            w.toWylieOptions(text, [], True, budget=BUDGET)
+    except BudgetExceeded:
+        pytest.fail("%s %s: not linear" % (direction, name))
+
+
+@pytest.mark.parametrize("escape", [u"\\UFFFFFFFF", u"\\U00110000", u"\\uD800", u"\\udfff"])
+def test_invalid_escapes(escape):
+    w = Wylie()
+    warns = []
+    assert w.fromWylie(u"ka " + escape + u" ga", warns, budget=BUDGET) == u"ཀ་་ག"
+    assert warns == [u"line 1: \"%s\": invalid hex code." % escape]
+    warns = []
+    out = w.fromWylie(u"ka [abc " + escape + u" def] ga", warns, budget=BUDGET)
+    assert out == u"ཀ་abc  def་ག"
+    assert len(warns) == 1
+    out.encode("utf-8")
+
+
+def test_valid_escapes():
+    w = Wylie()
+    assert w.fromWylie(u"\\u0f40 \\U0010FFFF", []) == u"ཀ་\U0010ffff"
+
+
+#  printing the warnings does not change what an aggregator receives: raw messages, by syllable
+def test_aggregator_with_printed_warnings(capsys):
+    text = u"kkka kaq dgks \\UFFFFFFFF bsgrubsss"
+    quiet = WarningAggregator()
+    Wylie().fromWylie(text, quiet)
+    w = Wylie()
+    w.print_warnings = True
+    printed = WarningAggregator()
+    w.fromWylie(text, printed)
+    assert printed.problems == quiet.problems
+    assert (u"Expected vowel after \"k\".", u"kkka") in printed.problems
+    assert u"line 1: \"kkka\": Expected vowel after \"k\"." in capsys.readouterr().out
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from Wylie import Wylie
+from WylieCanonical import WylieCanonicalizer
+from WylieHarness import InputGenerator
+
+
+def test_examples():
+    c = WylieCanonicalizer(Wylie())
+    assert c.canonicalize(u"bsgrub pa’i g+har k+ya") == u"bsgrub pa'i g+har kya"
+    assert c.canonicalize(u"g.yag gyag dgas") == u"g.yag gyag dgas"
+
+
+#  each tsekbar, written from its stacks, is what the round trip toWylie(fromWylie(x)) gives
+def test_matches_round_trip():
+    w = Wylie()
+    c = WylieCanonicalizer(w)
+    gen = InputGenerator(3, w)
+    for _ in range(3000):
+        syl = gen.syllable()
+        try:
+            expected = w.toWylie(w.fromWylie(syl, []))
+        except Exception:
+            # toWylie() raises on a few stacks
+            continue
+        assert c.canonicalize(syl) == expected, syl
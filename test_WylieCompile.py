@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+from Wylie import Wylie
+from WylieCompile import differential, loadFast
+from WylieHarness import InputGenerator
+
+#  hand-picked cases: stacks, ambiguous syllables, Sanskrit, finals, comments, escapes, spacing
+CORPUS = [
+    u"bsgrubs pa'i g.yag dgas gdams brgyad 'gro ba",
+    u"oM maNi padme hU~M: k+Sha dz+nyA na/ rnam par snang mdzad",
+    u"kka g+h b+r+k+y gda dga bya. ba'am ba'o",
+    u"[comment [nested] \\[ \\u0f40] ka \\U00000f40 \\x [unfinished",
+    u"ka  \n  kha   ga\r\nnga_ca//",
+    u"བསྒྲུབས་པའི་གཡག། ཨོཾ་མ་ཎི་པདྨེ་ཧཱུྃ༔ ཀྵ ཀྐི",
+    u"ཀ  ཁ English text ག\n ༀ ྲྀ ​",
+]
+
+
+#  the fixed corpus: the cases above, and generated EWTS and Unicode inputs
+def corpus():
+    gen = InputGenerator(7)
+    texts = list(CORPUS)
+    texts.extend(gen.wylieText(30) for _ in range(150))
+    texts.extend(gen.reference.fromWylie(gen.wylieText(30)) for _ in range(150))
+    return texts
+
+
+def test_fast_engine_matches_reference():
+    assert differential(corpus(), loadFast()(), Wylie()) == []
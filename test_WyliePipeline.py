@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+from Wylie import Wylie
+from WyliePipeline import WyliePipeline
+
+LINES = [u"bkra shis\n", u"\n", u"   \n", u"  bde legs\n", u"ka"]
+
+
+#  each line comes out as fromWylie() gives it on its own, blank lines included
+def test_same_as_fromWylie():
+    w = Wylie()
+    expected = []
+    for n, s in enumerate(LINES, 1):
+        ws = []
+        expected.append((n, w.fromWylie(s, ws, n), ws))
+    for workers in (None, 2):
+        pipe = WyliePipeline("fromWylie", workers=workers, executor="thread", wylie=w, batch=2)
+        assert list(pipe.run(LINES)) == expected
+    # fix_spacing removes leading whitespace, line ending included
+    assert expected[2] == (3, u"", [u"No Tibetan characters found!"])
+
+
+#  with skip_blank, whitespace-only lines are passed through as they are, without warnings
+def test_skip_blank():
+    pipe = WyliePipeline("fromWylie", wylie=Wylie(), skip_blank=True)
+    got = list(pipe.run(LINES))
+    assert got[1] == (2, u"\n", [])
+    assert got[2] == (3, u"   \n", [])
+    assert got[3][1] == Wylie().fromWylie(LINES[3], [])
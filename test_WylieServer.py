@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+from WylieServer import WylieServer
+
+
+#  send raw request bytes to a server on localhost; returns (status, body) of the response
+async def _exchange(server, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(request)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split()[1])
+    length = 0
+    for line in head.decode("latin-1").split("\r\n"):
+        name, _, value = line.partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    body = await reader.readexactly(length)
+    writer.close()
+    return status, body
+
+
+#  run 'requests' against a fresh server; returns their responses
+def _run(requests, **options):
+    async def go():
+        server = WylieServer(port=0, workers=2, **options)
+        await server.start()
+        try:
+            return [await _exchange(server, r) for r in requests]
+        finally:
+            await server.close()
+    return asyncio.run(go())
+
+
+def _post(path, body, content_type="text/plain"):
+    return ("POST %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: %s\r\nContent-Length: %d\r\n"
+            "Connection: close\r\n\r\n" % (path, content_type, len(body))).encode("ascii") + body
+
+
+def test_plain_text():
+    (status, body), = _run([_post("/fromWylie", u"bkra shis".encode("utf-8"))])
+    assert status == 200
+    assert body.decode("utf-8") == u"བཀྲ་ཤིས"
+
+
+def test_json_batch():
+    req = json.dumps({"texts": [u"ka", u"kha"]}).encode("utf-8")
+    (status, body), = _run([_post("/fromWylie", req, "application/json")])
+    assert status == 200
+    assert json.loads(body.decode("utf-8"))["results"] == [u"ཀ", u"ཁ"]
+
+
+def test_to_wylie():
+    (status, body), = _run([_post("/toWylie", u"བཀྲ་ཤིས".encode("utf-8"))])
+    assert status == 200
+    assert body.decode("utf-8") == u"bkra shis"
+
+
+def test_unknown_endpoint():
+    (status, _), = _run([_post("/nowhere", b"ka")])
+    assert status == 404
+
+
+def test_invalid_content_length():
+    for length in ("abc", "-5"):
+        request = ("POST /fromWylie HTTP/1.1\r\nContent-Length: %s\r\n\r\nka" % length).encode("ascii")
+        (status, _), = _run([request])
+        assert status == 400
+
+
+def test_body_too_large():
+    (status, _), = _run([_post("/fromWylie", b"ka " * 100)], max_body=10)
+    assert status == 413
+
+
+def test_bad_request_line():
+    (status, _), = _run([b"GARBAGE\r\n\r\n"])
+    assert status == 400
+
+
+def test_too_many_headers():
+    headers = "".join("X-Header-%d: %d\r\n" % (k, k) for k in range(20))
+    request = ("POST /fromWylie HTTP/1.1\r\n%sContent-Length: 2\r\n\r\nka" % headers).encode("ascii")
+    (status, _), = _run([request], max_headers=10)
+    assert status == 431
+    (status, body), = _run([request])
+    assert status == 200
+
+
+def test_header_bytes():
+    # over the total, and one line longer than the stream reader's limit
+    for headers in ("X-A: %s\r\nX-B: %s\r\n" % ("a" * 600, "b" * 600), "X-Long: %s\r\n" % ("a" * 3000)):
+        request = ("POST /fromWylie HTTP/1.1\r\n%sContent-Length: 2\r\n\r\nka" % headers).encode("ascii")
+        (status, _), = _run([request], max_header_bytes=1024)
+        assert status == 431
+
+
+def test_request_line_too_long():
+    request = ("GET /%s HTTP/1.1\r\n\r\n" % ("a" * 3000)).encode("ascii")
+    (status, _), = _run([request], max_header_bytes=1024)
+    assert status == 400
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+from WylieVerify import RoundTripVerifier
+
+
+def _verify(text, unicode):
+    v = RoundTripVerifier(unicode=unicode)
+    v.add(text, "t")
+    return v.run()
+
+
+#  [comments] and escapes are not syllables
+def test_wylie_comments_and_escapes():
+    summary = _verify(u"bkra shis [a comment\nover two lines] \\u0f40 \\U00000f41 pa’i\nbde legs", False)
+    assert summary["failures"] == []
+    assert summary["syllables"] == 5
+
+
+#  a syllable whose round trip raises is reported, and the others are still checked
+def test_exceptions_are_failures():
+    for text, unicode, bad in ((u"ka fa ga\nkha", False, u"fa"), (u"ཀཀ བུ༹ག ག\nཁ", True, u"བུ༹ག")):
+        summary = _verify(text, unicode)
+        assert summary["distinct"] == 4
+        failure, = summary["failures"]
+        assert failure["syllable"] == bad
+        assert failure["roundtrip"] is None
+        assert failure["error"].startswith("UnboundLocalError: ")
+        assert failure["first"] == "t:1:4"